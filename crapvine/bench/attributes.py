@@ -0,0 +1,69 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Measures the per-object footprint and attribute access cost of the
+Attributed classes.
+
+Run as ``python -m crapvine.bench.attributes [count]``."""
+
+import sys
+import timeit
+
+from crapvine.xml.trait import Trait, TraitList
+
+def object_size(obj):
+	size = sys.getsizeof(obj)
+	if hasattr(obj, '__dict__'):
+		size += sys.getsizeof(obj.__dict__)
+	return size
+
+def build_traits(count):
+	traits = []
+	for i in xrange(count):
+		t = Trait()
+		t.name = 'Trait %d' % (i % 100)
+		t.val = str(i % 5 + 1)
+		t.note = 'note' if i % 3 else ''
+		traits.append(t)
+	return traits
+
+def main(argv):
+	count = int(argv[1]) if len(argv) > 1 else 20000
+
+	start = timeit.default_timer()
+	traits = build_traits(count)
+	build_time = timeit.default_timer() - start
+
+	per_object = object_size(traits[0])
+	print 'Built %d traits in %.3fs' % (count, build_time)
+	print 'Bytes per trait (object + instance dict): %d' % (per_object)
+	print 'Total trait bytes: %d' % (per_object * count)
+
+	t = traits[-1]
+	reads = timeit.Timer(lambda: (t.name, t.val, t.note)).timeit(200000)
+	print 'Attribute read (3 attrs): %.0f ns' % (reads / 200000 * 1e9)
+	defaults = Trait()
+	reads = timeit.Timer(lambda: (defaults.name, defaults.val, defaults.note)).timeit(200000)
+	print 'Default read (3 attrs):   %.0f ns' % (reads / 200000 * 1e9)
+	tl = TraitList()
+	tl.name = 'Physical'
+	writes = timeit.Timer(lambda: setattr(tl, 'name', 'Social')).timeit(200000)
+	print 'Attribute write:          %.0f ns' % (writes / 200000 * 1e9)
+
+if __name__ == '__main__':
+	main(sys.argv)
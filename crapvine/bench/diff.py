@@ -0,0 +1,49 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+"""Times diff_chronicles between two loaded copies of a chronicle, one of
+them lightly edited.
+
+Run as ``python -m crapvine.bench.diff [characters]``."""
+
+import sys
+import time
+from StringIO import StringIO
+
+from crapvine.xml.grapevine_xml import GEX
+from crapvine.xml.chronicle_diff import diff_chronicles
+from crapvine.bench.parse import make_chronicle
+
+def main(argv):
+	count = int(argv[1]) if len(argv) > 1 else 2000
+	data = make_chronicle(count)
+	old = GEX()
+	old.load_from_stream(StringIO(data))
+	new = GEX()
+	new.load_from_stream(StringIO(data))
+	vampires = new.chronicle_loader.vampires
+	for i in range(0, count, 100):
+		vampire = vampires['Vampire %d' % (i)]
+		vampire.traitlists[0].increment_trait('Physical 0')
+	start = time.time()
+	changes = diff_chronicles(old, new)
+	print '%d characters, %d changes, %.3f s' % (count, len(changes), time.time() - start)
+
+if __name__ == '__main__':
+	main(sys.argv)
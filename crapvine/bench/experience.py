@@ -0,0 +1,74 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compares the memory used by an experience ledger and the time taken to
+recalculate its totals with ExperienceEntry objects and with column
+storage.
+
+Run as ``python -m crapvine.bench.experience [entries] [characters]``.
+Memory is measured from the resident size of the process on Linux."""
+
+from __future__ import with_statement
+import sys
+import time
+
+from crapvine.xml.experience import Experience, ExperienceEntry
+
+def make_entries(count):
+	for i in range(count):
+		entry = ExperienceEntry()
+		entry.read_attributes({'date': '%d/1/%d' % (i // 10 % 12 + 1, 1990 + i // 120),
+			'type': str((0, 3, 0, 6, 4, 3)[i % 6]), 'change': str(i % 5 + 1),
+			'reason': 'Session %d' % (i % 40)})
+		yield entry
+
+def resident_bytes():
+	with open('/proc/self/statm') as f:
+		return int(f.read().split()[1]) * 4096
+
+def build(count, characters, compact):
+	ledgers = []
+	for i in range(characters):
+		exp = Experience()
+		if compact:
+			exp.compact()
+		for entry in make_entries(count):
+			exp.add_entry(entry, False)
+		exp.recalculate_from(0, count - 1)
+		ledgers.append(exp)
+	return ledgers
+
+def main(argv):
+	count = int(argv[1]) if len(argv) > 1 else 3000
+	characters = int(argv[2]) if len(argv) > 2 else 20
+	# Columns first, as memory freed by the objects run would be reused
+	for label, compact in (('columns', True), ('objects', False)):
+		before = resident_bytes()
+		ledgers = build(count, characters, compact)
+		used = resident_bytes() - before
+		exp = ledgers[0]
+		start = time.time()
+		for i in range(5):
+			exp.recalculate_from(0, len(exp.entries) - 1)
+		elapsed = (time.time() - start) / 5
+		print '%-8s %6.0f bytes/entry  recalculate %d entries %.4f s' % (label,
+			float(used) / (count * characters), count, elapsed)
+		del ledgers, exp
+
+if __name__ == '__main__':
+	main(sys.argv)
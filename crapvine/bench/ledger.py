@@ -0,0 +1,68 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Times check_ledgers over a generated chronicle against replaying each
+character's entries one at a time with calculate_expenditures_from.
+
+Run as ``python -m crapvine.bench.ledger [characters]``. Needs NumPy."""
+
+import sys
+import time
+from StringIO import StringIO
+
+from crapvine.xml.grapevine_xml import GEX
+from crapvine.xml.experience import ExperienceEntry
+from crapvine.xml.ledger import check_ledgers
+from crapvine.bench.parse import make_chronicle
+
+def replay_entries(vampires):
+	"Counts the stored entry totals that differ from a one at a time replay."
+	count = 0
+	for vampire in vampires:
+		previous = ExperienceEntry()
+		for entry in vampire.experience.entries:
+			replayed = ExperienceEntry()
+			replayed.type = entry.type
+			replayed.change = entry.change
+			replayed.calculate_expenditures_from(previous)
+			for name in ('earned', 'unspent'):
+				if replayed.get_number(name) != entry.get_number(name):
+					count += 1
+			previous = replayed
+	return count
+
+def main(argv):
+	count = int(argv[1]) if len(argv) > 1 else 2000
+	gex = GEX()
+	gex.load_from_stream(StringIO(make_chronicle(count)))
+	vampires = gex.chronicle_loader.vampires.values()
+	for vampire in vampires:
+		vampire.experience.recalculate_from(0, len(vampire.experience.entries) - 1)
+		vampire.experience.earned = vampire.experience.entries[-1].earned
+		vampire.experience.unspent = vampire.experience.entries[-1].unspent
+	for vampire in vampires[::100]:
+		vampire.experience.entries[3].unspent = '1'
+	start = time.time()
+	found = replay_entries(vampires)
+	print 'one at a time %d mismatches, %.3f s' % (found, time.time() - start)
+	start = time.time()
+	found = check_ledgers(vampires)
+	print 'vectorized    %d mismatches, %.3f s' % (len(found), time.time() - start)
+
+if __name__ == '__main__':
+	main(sys.argv)
@@ -0,0 +1,64 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+"""Times GEX.load_parallel against a single process load for a range of
+process counts.
+
+Run as ``python -m crapvine.bench.parallel [characters]``."""
+
+import os
+import sys
+import time
+import tempfile
+from multiprocessing import cpu_count
+
+from crapvine.xml.grapevine_xml import GEX
+from crapvine.bench.parse import make_chronicle
+
+def time_load(filename, processes):
+	gex = GEX()
+	start = time.time()
+	if processes:
+		gex.load_parallel(filename, processes)
+	else:
+		gex.load_from_file(filename)
+	return time.time() - start
+
+def main(argv):
+	count = int(argv[1]) if len(argv) > 1 else 2000
+	handle, filename = tempfile.mkstemp(suffix='.gex')
+	try:
+		os.write(handle, make_chronicle(count))
+		os.close(handle)
+		# Build the sidecar index up front so it is not part of the timings
+		GEX().load_parallel(filename, 1)
+		single = time_load(filename, 0)
+		print 'single process   %7.3f s' % (single)
+		processes = 1
+		while processes <= cpu_count():
+			elapsed = time_load(filename, processes)
+			print '%2d processes     %7.3f s  %5.2fx' % (processes, elapsed, single / elapsed)
+			processes *= 2
+	finally:
+		for name in (filename, filename + '.idx'):
+			if os.path.exists(name):
+				os.remove(name)
+
+if __name__ == '__main__':
+	main(sys.argv)
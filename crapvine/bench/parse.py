@@ -0,0 +1,64 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+"""Times chronicle loading with each GEX parser backend.
+
+Run as ``python -m crapvine.bench.parse [characters]``."""
+
+import sys
+import time
+from StringIO import StringIO
+
+from crapvine.xml.grapevine_xml import GEX
+from crapvine.xml.vampire_loader import LoadOptions
+
+def make_chronicle(count):
+	lines = ['<?xml version="1.0"?>', '<grapevine version="3" chronicle="Bench">']
+	for i in range(count):
+		lines.append('<vampire name="Vampire %d" clan="Brujah" sect="Camarilla" blood="10" startdate="3/4/2007">' % (i))
+		lines.append('<experience unspent="5" earned="20">')
+		for j in range(8):
+			lines.append('<entry date="%d/4/2007" type="0" change="%d" reason="Session &lt;%d&gt;"/>' % (j + 1, j + 1, j))
+		lines.append('</experience>')
+		for name in ('Physical', 'Social', 'Mental', 'Abilities'):
+			lines.append('<traitlist name="%s" abc="yes" display="1">' % (name))
+			for k in range(6):
+				lines.append('<trait name="%s %d" val="%d" note="x"/>' % (name, k, k % 3 + 1))
+			lines.append('</traitlist>')
+		lines.append('</vampire>')
+	lines.append('</grapevine>')
+	return '\n'.join(lines)
+
+def time_load(backend, data, options):
+	gex = GEX(backend)
+	start = time.time()
+	gex.load_from_stream(StringIO(data), options=options)
+	return time.time() - start
+
+def main(argv):
+	count = int(argv[1]) if len(argv) > 1 else 1000
+	data = make_chronicle(count)
+	for label, options in (('full', None), ('roster', LoadOptions(sections=()))):
+		for backend in GEX.backends:
+			best = min(time_load(backend, data, options) for i in range(3))
+			print '%-6s %-6s %7.3f s  %6.2f MB/s' % (label, backend, best,
+				len(data) / best / 1e6)
+
+if __name__ == '__main__':
+	main(sys.argv)
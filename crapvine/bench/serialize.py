@@ -0,0 +1,53 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Times attribute serialization and reading for the sheet classes.
+
+Run as ``python -m crapvine.bench.serialize [repeat]``."""
+
+import sys
+import timeit
+
+from crapvine.types.vampire import Vampire
+from crapvine.xml.trait import Trait, TraitList
+from crapvine.xml.experience import ExperienceEntry
+
+samples = [
+	(Vampire, {'name': 'Marcus', 'clan': 'Brujah', 'sect': 'Camarilla',
+		'nature': 'Bravo', 'demeanor': 'Rebel', 'narrator': 'Bob "B"',
+		'blood': '12', 'tempblood': '10', 'willpower': '6', 'generation': '10',
+		'startdate': '3/4/2007', 'lastmodified': '3/4/2008 10:11:12 PM',
+		'npc': 'no'}),
+	(Trait, {'name': 'Brawl', 'val': '3', 'note': 'bare hands'}),
+	(TraitList, {'name': 'Physical', 'abc': 'yes', 'display': '1'}),
+	(ExperienceEntry, {'date': '3/4/2008', 'type': '0', 'change': '2',
+		'earned': '20', 'unspent': '4', 'reason': 'Session <12> & more'}),
+]
+
+def main(argv):
+	repeat = int(argv[1]) if len(argv) > 1 else 20000
+	for cls, attrs in samples:
+		obj = cls()
+		obj.read_attributes(attrs)
+		read = timeit.Timer(lambda: cls().read_attributes(attrs)).timeit(repeat)
+		save = timeit.Timer(lambda: obj.get_attrs_xml()).timeit(repeat)
+		print '%-16s read %6.2f us   save %6.2f us' % (cls.__name__,
+			read / repeat * 1e6, save / repeat * 1e6)
+
+if __name__ == '__main__':
+	main(sys.argv)
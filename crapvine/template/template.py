@@ -78,6 +78,12 @@ class Template(object):
 				return tl
 		return None
 
+	def __tally_count(self, attribute_name):
+		val = self.character.get_number(attribute_name)
+		if val is None:
+			raise AttributeError('%s has no tally value' % (attribute_name))
+		return int(round(val))
+
 	def __start_progress(self, total_passes, text=None):
 		if self.__progress:
 			self.__progress.set_pulse_step(100.0 / float(total_passes) / 100.0)
@@ -171,15 +177,15 @@ class Template(object):
 				if len(tokens) == 2:
 					try:
 						#print "%s" % (tokens[1].lower())
-						tally_val = self.character[tokens[1].lower()]
-						rep_str = "%s" % (dot * int(round(float(tally_val))))
+						tally_val = self.__tally_count(tokens[1].lower())
+						rep_str = "%s" % (dot * tally_val)
 						out_str = "%s%s%s" % (out_str[:keyword.begin], rep_str, out_str[keyword.end+1:])
 					except AttributeError:
 						pass
 				elif len(tokens) == 3:
 					try:
-						prm_val = int(round(float(self.character[tokens[1].lower()])))
-						tmp_val = int(round(float(self.character[tokens[2].lower()])))
+						prm_val = self.__tally_count(tokens[1].lower())
+						tmp_val = self.__tally_count(tokens[2].lower())
 						rep_str = ''
 						if prm_val == tmp_val:
 							rep_str = "%s" % (dot * prm_val)
@@ -263,6 +269,9 @@ class Template(object):
 		if len(traitlists) == 0:
 			return "%s%s" % (pre_string, post_string)
 
+		# Render each traitlist once per display, not once per keyword per row
+		rendered = {}
+
 		# Begin replacination von fuquon
 		imprints = []
 		keep_going = True
@@ -292,8 +301,11 @@ class Template(object):
 						iter = tl.iter_next(iter)
 						traitlist_iters[tl_name] = iter
 					if iter:
-						trait = tl.get_item_from_path(tl.get_path(iter))
-						rep_str = "%s" % (trait.display_str(display))
+						path = tl.get_path(iter)
+						lines = rendered.get((tl_name, display))
+						if lines is None:
+							lines = rendered[(tl_name, display)] = tl.render(display)
+						rep_str = "%s" % (lines[path[0]])
 						replaces.append((k.begin, rep_str, k.end+1))
 						#l_str = "%s%s%s" % (l_str[:k.begin], rep_str, l_str[k.end+1:])
 						#print "l_str on keyword %s with %s\n%s" % (k.text.lower(), rep_str, l_str)
@@ -0,0 +1,321 @@
+import copy
+import cPickle
+import unittest
+from StringIO import StringIO
+from datetime import datetime
+from crapvine.xml import attribute
+from crapvine.xml.experience import ExperienceEntry
+from crapvine.xml.trait import Trait, TraitList
+from crapvine.types.vampire import Vampire
+from crapvine.types.chronicle import Chronicle
+
+class AttributeStorageTestCase(unittest.TestCase):
+	def testNoInstanceDict(self):
+		t = Trait()
+		assert not hasattr(t, '__dict__')
+		self.assertRaises(AttributeError, setattr, t, 'not_an_attribute', 1)
+
+	def testDefaults(self):
+		t = Trait()
+		self.assertEqual(t.val, '1')
+		self.assertEqual(t.note, '')
+		t.val = '3'
+		self.assertEqual(t.val, '3')
+
+	def testLinkedDefaults(self):
+		v = Vampire()
+		v.blood = '10'
+		self.assertEqual(v.tempblood, '10')
+		v.tempblood = '4'
+		self.assertEqual(v.tempblood, '4')
+		self.assertEqual(v.blood, '10')
+
+	def testInstanceAttrs(self):
+		tl = TraitList()
+		tl.name = 'Physical'
+		assert tl.traits is tl.list
+		self.assertEqual(tl.name, 'Physical')
+
+	def testCopy(self):
+		t = Trait()
+		t.name = 'Brawl'
+		t.val = '2'
+		c = copy.copy(t)
+		self.assertEqual(c.name, 'Brawl')
+		self.assertEqual(c.val, '2')
+		c.val = '4'
+		self.assertEqual(t.val, '2')
+
+class DateAttrTestCase(unittest.TestCase):
+	def testLazyParse(self):
+		e = ExperienceEntry()
+		e.date = '3/4/2008'
+		self.assertEqual(ExperienceEntry.date.raw_text(e), '3/4/2008')
+		self.assertEqual(e.date, datetime(2008, 3, 4))
+
+	def testRoundTripKeepsText(self):
+		e = ExperienceEntry()
+		e.date = '3/4/2008'
+		assert 'date="3/4/2008"' in e.get_xml()
+		e.date = datetime(2008, 3, 5)
+		self.assertEqual(ExperienceEntry.date.raw_text(e), None)
+		assert 'date="03/05/2008"' in e.get_xml()
+
+	def testMemoized(self):
+		a = ExperienceEntry()
+		b = ExperienceEntry()
+		a.date = '1/2/2007 10:11:12 PM'
+		b.date = '1/2/2007 10:11:12 PM'
+		assert a.date is b.date
+		assert '1/2/2007 10:11:12 PM' in attribute.parsed_dates
+
+class NumberAsTextAttrTestCase(unittest.TestCase):
+	def testPlainNumbers(self):
+		t = Trait()
+		t.val = '3.0'
+		self.assertEqual(t.val, '3')
+		self.assertEqual(t.get_number('val'), 3.0)
+		t.val = '2.5'
+		self.assertEqual(t.val, '2.5')
+		self.assertEqual(t.get_number('val'), 2.5)
+
+	def testRangesAndOptions(self):
+		t = Trait()
+		t.val = '2-4'
+		self.assertEqual(t.val, '2-4')
+		self.assertEqual(t.get_number('val'), None)
+		self.assertEqual(Trait.val.numbers(t), (2.0, 4.0))
+		t.val = '2 or 4'
+		self.assertEqual(Trait.val.numbers(t), (2.0, 4.0))
+		self.assertRaises(ValueError, setattr, t, 'val', 'lots')
+
+	def testEnforcedTypes(self):
+		e = ExperienceEntry()
+		self.assertRaises(ValueError, setattr, e, 'type', '2.5')
+		self.assertRaises(ValueError, setattr, e, 'change', '2-4')
+		e.type = '3'
+		self.assertEqual(e.get_number('type'), 3.0)
+
+	def testSetNumber(self):
+		t = Trait()
+		t.set_number('val', 4.0)
+		self.assertEqual(t.val, '4')
+		t.set_number('val', 1.5)
+		self.assertEqual(t.val, '1.5')
+		self.assertEqual(t.get_number('val'), 1.5)
+
+	def testLinkedNumber(self):
+		v = Vampire()
+		v.willpower = '6'
+		self.assertEqual(v.get_number('tempwillpower'), 6.0)
+		v.tempwillpower = '2'
+		self.assertEqual(v.get_number('tempwillpower'), 2.0)
+
+class SerializationTestCase(unittest.TestCase):
+	def testCompiledNames(self):
+		self.assertEqual(Trait.xml_attr_names, ('name', 'note', 'cumguzzle', 'val'))
+		self.assertEqual(TraitList.xml_attr_names, ('name', 'display', 'abc', 'atomic', 'negative'))
+
+	def testQuoting(self):
+		t = Trait()
+		t.read_attributes({'name': 'Brawl', 'note': 'a & b', 'val': '2', 'unknown': 'x'})
+		self.assertEqual(t.get_attrs_xml(), 'name="Brawl" note="a &amp; b" val="2"')
+		t.note = 'say "hi"'
+		self.assertEqual(t.get_attrs_xml(), 'name="Brawl" note=\'say "hi"\' val="2"')
+
+	def testDefaults(self):
+		tl = TraitList()
+		tl.read_attributes({'name': 'Physical', 'abc': 'yes'})
+		self.assertEqual(tl.get_attrs_xml(), 'name="Physical" abc="yes"')
+		self.assertEqual(tl.get_attrs_xml(include_defaults=True),
+			'name="Physical" display="0" abc="yes" atomic="no" negative="no"')
+
+class StreamingTestCase(unittest.TestCase):
+	def testWriteMatchesGetXml(self):
+		v = Vampire()
+		v.name = 'Marcus'
+		v.biography = 'Born & raised'
+		tl = TraitList()
+		tl.name = 'Physical'
+		for name in ['Brawny', 'Quick']:
+			t = Trait()
+			t.name = name
+			tl.add_trait(t)
+		v.add_traitlist(tl)
+		empty = TraitList()
+		empty.name = 'Status'
+		v.add_traitlist(empty)
+		out = StringIO()
+		v.write_xml(out, '   ')
+		self.assertEqual(out.getvalue(), v.get_xml('   '))
+		self.assertEqual(v.get_xml(), '\n'.join([
+			'<vampire name="Marcus">',
+			'   <traitlist name="Physical">',
+			'      <trait name="Brawny"/>',
+			'      <trait name="Quick"/>',
+			'   </traitlist>',
+			'   <traitlist name="Status"/>',
+			'   <biography>',
+			'      <![CDATA[Born &amp; raised]]>',
+			'   </biography>',
+			'</vampire>']))
+		self.assertEqual(str(v), v.get_xml())
+
+	def testStrWithoutWriter(self):
+		chronicle = Chronicle()
+		chronicle.chronicle = 'Carlsbad by Night'
+		assert str(chronicle).startswith('<crapvine.types.chronicle.Chronicle object')
+
+class DirtyTrackingTestCase(unittest.TestCase):
+	def testLoadIsClean(self):
+		t = Trait()
+		t.read_attributes({'name': 'Brawl', 'val': '2'})
+		assert not t.is_dirty()
+		self.assertEqual(t.dirty_fields(), frozenset())
+
+	def testSetMarksDirty(self):
+		t = Trait()
+		t.read_attributes({'name': 'Brawl', 'val': '2'})
+		t.note = 'fists'
+		t.set_number('val', 3)
+		self.assertEqual(t.dirty_fields(), frozenset(['note', 'val']))
+		t.clear_dirty()
+		assert not t.is_dirty()
+
+	def testSubtree(self):
+		v = Vampire()
+		tl = TraitList()
+		tl.name = 'Physical'
+		t = Trait()
+		t.name = 'Brawny'
+		tl.add_trait(t)
+		v.add_traitlist(tl)
+		assert v.has_changes()
+		v.clear_dirty(deep=True)
+		assert not v.has_changes()
+		t.val = '2'
+		assert v.has_changes()
+		assert not v.is_dirty()
+		assert not tl.is_dirty()
+		tl.decrement_trait('Brawny')
+		v.clear_dirty(deep=True)
+		tl.decrement_trait('Brawny')
+		self.assertEqual(tl.dirty_fields(), frozenset(['traits']))
+
+class StateTestCase(unittest.TestCase):
+	def testRoundTrip(self):
+		v = Vampire()
+		v.read_attributes({'name': 'Marcus', 'blood': '12', 'startdate': '3/4/2007'})
+		tl = TraitList()
+		tl.name = 'Physical'
+		t = Trait()
+		t.read_attributes({'name': 'Brawny', 'val': '3'})
+		tl.add_trait(t)
+		v.add_traitlist(tl)
+		v.clear_dirty(deep=True)
+		t.note = 'strong'
+		copied = cPickle.loads(cPickle.dumps(v, 2))
+		self.assertEqual(copied.get_xml(), v.get_xml())
+		self.assertEqual(copied.get_number('blood'), 12.0)
+		assert copied.traitlists[0].list is copied.traitlists[0].traits
+		copied_trait = copied.traitlists[0].traits[0]
+		assert not copied.has_changes()
+		assert copied_trait._parent is copied.traitlists[0]
+		assert copied.traitlists[0]._parent is copied
+
+	def testHashNotSaved(self):
+		v = Vampire()
+		v.name = 'Marcus'
+		tl = TraitList()
+		tl.name = 'Physical'
+		v.add_traitlist(tl)
+		v.structural_hash()
+		copied = cPickle.loads(cPickle.dumps(v, 2))
+		self.assertEqual((copied._hash, copied.traitlists[0]._hash), (None, None))
+		self.assertEqual(copied.structural_hash(), v.structural_hash())
+		self.assertEqual(len(Vampire.state_slots), len(v.__getstate__()[1]))
+		assert '_hash' not in Vampire.state_slots
+
+	def testCompact(self):
+		t = Trait()
+		t.read_attributes({'name': 'Brawny', 'val': '3'})
+		version, values = t.__getstate__()
+		self.assertEqual(len(values), len(Trait.state_slots))
+		self.assertEqual(copy.copy(t).get_xml(), t.get_xml())
+
+	def testShallowCopy(self):
+		tl = TraitList()
+		tl.name = 'Physical'
+		t = Trait()
+		t.read_attributes({'name': 'Brawny', 'val': '3'})
+		tl.add_trait(t)
+		tl.get_total_value()
+		copied = copy.copy(tl)
+		assert copied.traits is tl.traits
+		assert t._parent is tl
+		t.val = '5'
+		self.assertEqual(tl.get_total_value(), 5)
+		assert tl.totals_consistent()
+
+	def testIncompatibleState(self):
+		t = Trait()
+		self.assertRaises(ValueError, t.__setstate__, (0, t.read_slots(t)))
+		self.assertRaises(ValueError, t.__setstate__, (t.state_version, ()))
+
+class StructuralHashTestCase(unittest.TestCase):
+	def make_vampire(self):
+		v = Vampire()
+		v.name = 'Marcus'
+		tl = TraitList()
+		tl.name = 'Physical'
+		t = Trait()
+		t.read_attributes({'name': 'Brawny', 'val': '2'})
+		tl.add_trait(t)
+		v.add_traitlist(tl)
+		return v
+
+	def testEqualContent(self):
+		self.assertEqual(self.make_vampire().structural_hash(), self.make_vampire().structural_hash())
+
+	def testChildChangeReachesRoot(self):
+		v = self.make_vampire()
+		before = v.structural_hash()
+		attributes = v.attributes_hash()
+		v.clear_dirty(deep=True)
+		v.traitlists[0].traits[0].note = 'strong'
+		assert v._hash is None
+		self.assertNotEqual(v.structural_hash(), before)
+		self.assertEqual(v.attributes_hash(), attributes)
+		changed = v.structural_hash()
+		v.traitlists[0].traits[0].note = 'stronger'
+		self.assertNotEqual(v.structural_hash(), changed)
+
+	def testSharedTrait(self):
+		v = self.make_vampire()
+		other = TraitList()
+		other.name = 'Mental'
+		t = v.traitlists[0].traits[0]
+		before = v.structural_hash()
+		other.add_trait(t)
+		assert t._parent is other
+		assert v._hash is None
+		t.val = '5'
+		self.assertNotEqual(v.structural_hash(), before)
+		expected = self.make_vampire()
+		expected.traitlists[0].traits[0].val = '5'
+		self.assertEqual(v.structural_hash(), expected.structural_hash())
+
+def suite():
+	suite = unittest.TestSuite()
+	suite.addTest(unittest.makeSuite(AttributeStorageTestCase))
+	suite.addTest(unittest.makeSuite(DateAttrTestCase))
+	suite.addTest(unittest.makeSuite(NumberAsTextAttrTestCase))
+	suite.addTest(unittest.makeSuite(SerializationTestCase))
+	suite.addTest(unittest.makeSuite(StreamingTestCase))
+	suite.addTest(unittest.makeSuite(DirtyTrackingTestCase))
+	suite.addTest(unittest.makeSuite(StateTestCase))
+	suite.addTest(unittest.makeSuite(StructuralHashTestCase))
+	return suite
+
+if __name__ == "__main__":
+	unittest.main()
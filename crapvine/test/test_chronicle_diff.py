@@ -0,0 +1,48 @@
+import unittest
+from StringIO import StringIO
+from crapvine.xml.grapevine_xml import GEX
+from crapvine.xml.trait import Trait
+from crapvine.xml.chronicle_diff import diff_chronicles
+from crapvine.test.test_gex import chronicle_xml
+
+class ChronicleDiffTestCase(unittest.TestCase):
+	def load(self, xml=chronicle_xml):
+		gex = GEX()
+		gex.load_from_stream(StringIO(xml))
+		return gex
+
+	def testIdentical(self):
+		self.assertEqual(diff_chronicles(self.load(), self.load()), [])
+
+	def testChanges(self):
+		old = self.load()
+		new = self.load(chronicle_xml.replace('clan="Toreador"', 'clan="Ventrue"')
+			.replace('reason="Brawl"', 'reason="Brawl practice"'))
+		marcus = new.chronicle_loader.vampires['Marcus']
+		marcus.traitlists[0].increment_trait('Quick')
+		t = Trait()
+		t.name = 'Tough'
+		marcus.traitlists[0].add_trait(t)
+		del new.chronicle_loader.vampires['Lucia']
+		changes = [str(c) for c in diff_chronicles(old, new)]
+		self.assertEqual(changes, [
+			'removed vampire Lucia',
+			'modified entry Marcus/experience/4/4/2007 (reason)',
+			'modified trait Marcus/Physical/Quick (val)',
+			'added trait Marcus/Physical/Tough'])
+
+	def testAddedCharacter(self):
+		new = self.load()
+		lucia = new.chronicle_loader.vampires.pop('Lucia')
+		changes = diff_chronicles(new, self.load())
+		self.assertEqual([(c.kind, c.element, c.path) for c in changes],
+			[('added', 'vampire', ('Lucia', ))])
+		self.assertEqual(changes[0].new.get_xml(), lucia.get_xml())
+
+def suite():
+	suite = unittest.TestSuite()
+	suite.addTest(unittest.makeSuite(ChronicleDiffTestCase))
+	return suite
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,173 @@
+import random
+import unittest
+from datetime import datetime
+from crapvine.xml.experience import Experience, ExperienceEntry
+
+def make_entry(date, type, change):
+	entry = ExperienceEntry()
+	entry.read_attributes({'date': date, 'type': type, 'change': change,
+		'earned': '0', 'unspent': '0'})
+	return entry
+
+def totals(exp):
+	return [(e.get_number('earned'), e.get_number('unspent')) for e in exp.entries]
+
+class ExperienceLedgerTestCase(unittest.TestCase):
+	def make(self):
+		return Experience()
+
+	def testOrderedInsertion(self):
+		exp = self.make()
+		exp.add_entry(make_entry('3/1/2007', '0', '5'))
+		exp.add_entry(make_entry('1/1/2007', '0', '2'))
+		exp.add_entry(make_entry('2/1/2007', '3', '1'))
+		self.assertEqual(totals(exp), [(2.0, 2.0), (2.0, 1.0), (7.0, 6.0)])
+		self.assertEqual(exp.get_number('unspent'), 6.0)
+
+	def testSameDateKeepsOrder(self):
+		exp = self.make()
+		first = make_entry('1/1/2007', '0', '2')
+		second = make_entry('1/1/2007', '3', '1')
+		exp.add_entry(first)
+		exp.add_entry(second)
+		self.assertEqual([e.get_number('type') for e in exp.entries], [0.0, 3.0])
+
+	def testBulkMatchesSingle(self):
+		rows = [('5/1/2007', '0', '3'), ('1/1/2007', '0', '10'), ('3/1/2007', '3', '4'),
+			('3/1/2007', '5', '2'), ('2/1/2007', '1', '1'), ('4/1/2007', '2', '20')]
+		single = self.make()
+		for row in rows:
+			single.add_entry(make_entry(*row))
+		bulk = self.make()
+		bulk.add_entries([make_entry(*row) for row in rows[:3]])
+		bulk.add_entries([make_entry(*row) for row in rows[3:]])
+		self.assertEqual(totals(bulk), totals(single))
+		self.assertEqual([e.get_number('change') for e in bulk.entries],
+			[e.get_number('change') for e in single.entries])
+		self.assertEqual(bulk.get_attrs_xml(), single.get_attrs_xml())
+
+	def testStopsAfterResets(self):
+		exp = self.make()
+		exp.add_entries([make_entry('1/1/2007', '0', '10'), make_entry('2/1/2007', '2', '20'),
+			make_entry('3/1/2007', '5', '7'), make_entry('4/1/2007', '3', '2')])
+		exp.entries[3].set_number('unspent', 99)
+		exp.add_entry(make_entry('1/15/2007', '0', '1'))
+		self.assertEqual(exp.entries[3].get_number('unspent'), 7.0)
+		self.assertEqual(exp.entries[4].get_number('unspent'), 99.0)
+
+	def testUpdateEntry(self):
+		exp = self.make()
+		exp.add_entries([make_entry('1/1/2007', '0', '10'), make_entry('2/1/2007', '3', '4'),
+			make_entry('3/1/2007', '3', '1')])
+		exp.update_entry((0, ), make_entry('2/15/2007', '0', '10'))
+		self.assertEqual(totals(exp), [(0.0, -4.0), (10.0, 6.0), (10.0, 5.0)])
+
+	def testUpdateEntryEarlier(self):
+		exp = self.make()
+		exp.add_entries([make_entry('1/1/2007', '0', '10'), make_entry('2/1/2007', '2', '20'),
+			make_entry('3/1/2007', '5', '7'), make_entry('4/1/2007', '0', '5'),
+			make_entry('5/1/2007', '3', '2'), make_entry('6/1/2007', '0', '1')])
+		exp.update_entry((4, ), make_entry('1/15/2007', '0', '5'))
+		updated = totals(exp)
+		exp.recalculate_from(0, len(exp.entries) - 1)
+		self.assertEqual(updated, totals(exp))
+		self.assertEqual(updated[-1], (26.0, 13.0))
+
+	def testRandomUpdates(self):
+		rng = random.Random(3)
+		row = lambda: ('%d/%d/2007' % (rng.randint(1, 12), rng.randint(1, 28)),
+			str(rng.randint(0, 6)), str(rng.randint(0, 9)))
+		exp = self.make()
+		exp.add_entries([make_entry(*row()) for i in range(30)])
+		for i in range(50):
+			exp.update_entry((rng.randrange(len(exp.entries)), ), make_entry(*row()))
+			updated = totals(exp)
+			exp.recalculate_from(0, len(exp.entries) - 1)
+			self.assertEqual(updated, totals(exp))
+
+	def testDateChange(self):
+		exp = self.make()
+		exp.add_entries([make_entry('1/1/2007', '0', '10'), make_entry('2/1/2007', '3', '4')])
+		exp.entries[1].date = '1/1/2006'
+		exp.entries.sort(key=lambda e: e.date)
+		exp.add_entry(make_entry('6/1/2006', '0', '1'))
+		self.assertEqual([e.get_number('change') for e in exp.entries], [4.0, 1.0, 10.0])
+
+	def testPointInTime(self):
+		exp = self.make()
+		exp.add_entries([make_entry('1/1/2007', '0', '10'), make_entry('3/1/2007', '3', '4'),
+			make_entry('3/1/2007', '0', '2'), make_entry('5/1/2007', '5', '1')])
+		self.assertEqual(exp.totals_as_of('12/31/2006'), (0.0, 0.0))
+		self.assertEqual(exp.totals_as_of('2/1/2007'), (10.0, 10.0))
+		self.assertEqual(exp.totals_as_of(datetime(2007, 3, 1)), (12.0, 8.0))
+		exp.add_entry(make_entry('2/1/2007', '0', '5'))
+		self.assertEqual(exp.totals_as_of('4/1/2007'), (17.0, 13.0))
+		self.assertEqual(exp.totals_as_of('6/1/2007'), (17.0, 1.0))
+
+	def testEntriesBetween(self):
+		exp = self.make()
+		exp.add_entries([make_entry('%d/1/2007' % (month), '0', str(month)) for month in range(1, 7)])
+		changes = lambda entries: [e.get_number('change') for e in entries]
+		self.assertEqual(changes(exp.entries_between('2/1/2007', '4/1/2007')), [2.0, 3.0, 4.0])
+		self.assertEqual(changes(exp.entries_between(end='1/15/2007')), [1.0])
+		self.assertEqual(changes(exp.entries_between(datetime(2007, 5, 2))), [6.0])
+		self.assertEqual(exp.entries_between('7/1/2007', '8/1/2007'), [])
+
+class CompactExperienceTestCase(ExperienceLedgerTestCase):
+	def make(self):
+		exp = Experience()
+		exp.compact()
+		return exp
+
+	def testSameXml(self):
+		rows = [('1/1/2007', '0', '10'), ('2/1/2007', '3', '2.50'), ('3/1/2007', '6', '0')]
+		plain = Experience()
+		plain.add_entries([make_entry(*row) for row in rows])
+		plain.entries[2].reason = 'Note & more'
+		compact = Experience()
+		compact.add_entries([make_entry(*row) for row in rows])
+		compact.compact()
+		compact.entries[2].reason = 'Note & more'
+		self.assertEqual(compact.get_xml(), plain.get_xml())
+		self.assertEqual(compact.structural_hash(), plain.structural_hash())
+		assert 'change="2.50"' in compact.get_xml()
+		compact.expand()
+		self.assertEqual(compact.get_xml(), plain.get_xml())
+
+	def testViews(self):
+		exp = self.make()
+		exp.add_entries([make_entry('1/1/2007', '0', '10'), make_entry('2/1/2007', '3', '4')])
+		exp.clear_dirty(deep=True)
+		view = exp.entries[1]
+		self.assertEqual((view.change, view.get_number('unspent')), (u'4', 6.0))
+		self.assertRaises(ValueError, setattr, view, 'type', '2.5')
+		view.change = '1.5'
+		assert exp.has_changes()
+		exp.update_entry((1, ), view)
+		self.assertEqual(exp.totals_as_of('3/1/2007'), (10.0, 8.5))
+		self.assertEqual(exp.entries[-1].get_xml(),
+			'<entry reason="" change="1.5" type="3" earned="10" unspent="8.5" date="2/1/2007"/>')
+
+	def testKeptTextsMove(self):
+		exp = self.make()
+		exp.add_entries([make_entry('%d/1/2007' % (month), '0', '%d.50' % (month))
+			for month in (1, 2, 3)])
+		exp.update_entry((1, ), make_entry('4/1/2007', '0', '4.50'))
+		self.assertEqual([e.change for e in exp.entries], ['1.50', '3.50', '4.50'])
+
+	def testPickle(self):
+		import cPickle
+		exp = self.make()
+		exp.add_entries([make_entry('1/1/2007', '0', '10'), make_entry('2/1/2007', '3', '2.50')])
+		copied = cPickle.loads(cPickle.dumps(exp, 2))
+		self.assertEqual(copied.get_xml(), exp.get_xml())
+		assert copied.entries.owner is copied
+
+def suite():
+	suite = unittest.TestSuite()
+	suite.addTest(unittest.makeSuite(ExperienceLedgerTestCase))
+	suite.addTest(unittest.makeSuite(CompactExperienceTestCase))
+	return suite
+
+if __name__ == "__main__":
+	unittest.main()
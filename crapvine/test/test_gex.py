@@ -0,0 +1,173 @@
+import unittest
+from StringIO import StringIO
+from xml.parsers.expat import ExpatError
+from xml.sax import SAXParseException
+from crapvine.xml.grapevine_xml import GEX
+from crapvine.xml.vampire_loader import LoadOptions
+from crapvine.xml.expat_loader import ExpatChronicleLoader
+
+chronicle_xml = """<?xml version="1.0"?>
+<grapevine version="3" chronicle="Test">
+   <vampire name="Marcus" clan="Brujah" startdate="3/4/2007">
+      <experience unspent="2" earned="5">
+         <entry date="3/4/2007" type="0" change="5" earned="5" unspent="5" reason="Start"/>
+         <entry date="4/4/2007" type="3" change="3" earned="5" unspent="2" reason="Brawl"/>
+      </experience>
+      <traitlist name="Physical" display="1">
+         <trait name="Brawny" val="2"/>
+         <trait name="Quick"/>
+      </traitlist>
+   </vampire>
+   <vampire name="Lucia" clan="Toreador">
+      <traitlist name="Social">
+         <trait name="Charming" val="3"/>
+      </traitlist>
+   </vampire>
+</grapevine>"""
+
+class GEXLoadingTestCase(unittest.TestCase):
+	def assertLoaded(self, gex):
+		vampires = gex.chronicle_loader.vampires
+		self.assertEqual(sorted(vampires.keys()), ['Lucia', 'Marcus'])
+		marcus = vampires['Marcus']
+		self.assertEqual(marcus.clan, 'Brujah')
+		self.assertEqual([t.name for t in marcus.traitlists[0].traits], ['Brawny', 'Quick'])
+		self.assertEqual(len(marcus.experience.entries), 2)
+		self.assertEqual(gex.chronicle_loader.chronicle.chronicle, 'Test')
+
+	def testLoadFromStream(self):
+		gex = GEX()
+		gex.load_from_stream(StringIO(chronicle_xml), chunk_size=17)
+		self.assertLoaded(gex)
+
+	def testFeed(self):
+		gex = GEX()
+		for i in range(0, len(chronicle_xml), 100):
+			gex.feed(chronicle_xml[i:i + 100])
+		gex.close()
+		self.assertLoaded(gex)
+
+	def testEmptyStream(self):
+		self.assertRaises(ExpatError, GEX('expat').load_from_stream, StringIO(''))
+		self.assertRaises(SAXParseException, GEX('sax').load_from_stream, StringIO(''))
+
+	def testFeedAfterError(self):
+		gex = GEX()
+		self.assertRaises(ExpatError, gex.feed, '<grapevine><vampire></grapevine>')
+		gex.feed(chronicle_xml)
+		gex.close()
+		self.assertLoaded(gex)
+
+	def testIterVampires(self):
+		gex = GEX()
+		names = []
+		for vampire in gex.iter_vampires(StringIO(chronicle_xml), chunk_size=64):
+			names.append(vampire.name)
+			assert not vampire.has_changes()
+		self.assertEqual(names, ['Marcus', 'Lucia'])
+		self.assertEqual(gex.chronicle_loader.vampires, {})
+
+	def testIterVampiresIsLazy(self):
+		gex = GEX()
+		stream = StringIO(chronicle_xml)
+		first = gex.iter_vampires(stream, chunk_size=64).next()
+		self.assertEqual(first.name, 'Marcus')
+		assert stream.tell() < len(chronicle_xml)
+
+class LoadOptionsTestCase(unittest.TestCase):
+	def load(self, options):
+		gex = GEX()
+		gex.load_from_stream(StringIO(chronicle_xml), options=options)
+		return gex.chronicle_loader.vampires
+
+	def testRoster(self):
+		vampires = self.load(LoadOptions(sections=()))
+		self.assertEqual(sorted(vampires.keys()), ['Lucia', 'Marcus'])
+		self.assertEqual(vampires['Marcus'].clan, 'Brujah')
+		self.assertEqual(vampires['Marcus'].traitlists, [])
+		self.assertEqual(vampires['Marcus'].experience, None)
+
+	def testSections(self):
+		vampires = self.load(LoadOptions(sections=['experience']))
+		self.assertEqual(len(vampires['Marcus'].experience.entries), 2)
+		self.assertEqual(vampires['Marcus'].traitlists, [])
+
+	def testNames(self):
+		vampires = self.load(LoadOptions(names=['Lucia']))
+		self.assertEqual(vampires.keys(), ['Lucia'])
+		self.assertEqual(vampires['Lucia'].traitlists[0].traits[0].name, 'Charming')
+
+	def testPredicate(self):
+		vampires = self.load(LoadOptions(predicate=lambda v: v.clan == 'Brujah'))
+		self.assertEqual(vampires.keys(), ['Marcus'])
+		self.assertEqual(len(vampires['Marcus'].traitlists[0].traits), 2)
+
+	def testCompactExperience(self):
+		vampires = self.load(LoadOptions(compact_experience=True))
+		experience = vampires['Marcus'].experience
+		self.assertEqual(experience.entries.__class__.__name__, 'EntryColumns')
+		self.assertEqual(experience.entries[1].reason, 'Brawl')
+		self.assertEqual(experience.get_xml(), self.load(None)['Marcus'].experience.get_xml())
+
+class CreatureRecorder(object):
+	def __init__(self):
+		self.elements = []
+	def startElement(self, name, attrs):
+		self.elements.append(name)
+	def endElement(self, name):
+		pass
+	def characters(self, ch):
+		pass
+	def startCDATA(self):
+		pass
+	def endCDATA(self):
+		pass
+
+class ExpatBackendTestCase(unittest.TestCase):
+	mixed_xml = chronicle_xml.replace('<vampire name="Lucia"', '''<mortal name="Bob">
+      <traitlist name="Physical">
+         <trait name="Tough"/>
+      </traitlist>
+   </mortal>
+   <vampire name="Lucia"''')
+
+	def load(self, backend, xml=chronicle_xml):
+		gex = GEX(backend)
+		gex.load_from_stream(StringIO(xml))
+		return gex.chronicle_loader
+
+	def testSameObjects(self):
+		sax = self.load('sax')
+		expat = self.load('expat')
+		self.assertEqual(expat.chronicle.get_attrs_xml(), sax.chronicle.get_attrs_xml())
+		self.assertEqual(sorted(expat.vampires.keys()), sorted(sax.vampires.keys()))
+		for name, vampire in sax.vampires.iteritems():
+			self.assertEqual(expat.vampires[name].get_xml(), vampire.get_xml())
+			assert not expat.vampires[name].has_changes()
+
+	def testOtherCreaturesAreSkipped(self):
+		vampires = self.load('expat', self.mixed_xml).vampires
+		self.assertEqual(sorted(vampires.keys()), ['Lucia', 'Marcus'])
+		self.assertEqual([t.name for t in vampires['Lucia'].traitlists[0].traits], ['Charming'])
+
+	def testRegisterCreature(self):
+		loader = ExpatChronicleLoader()
+		recorder = CreatureRecorder()
+		loader.register_creature('mortal', recorder)
+		loader.feed(self.mixed_xml)
+		loader.close()
+		self.assertEqual(recorder.elements, ['mortal', 'traitlist', 'trait'])
+		self.assertEqual(sorted(loader.vampires.keys()), ['Lucia', 'Marcus'])
+
+	def testUnknownBackend(self):
+		self.assertRaises(ValueError, GEX, 'dom')
+
+def suite():
+	suite = unittest.TestSuite()
+	suite.addTest(unittest.makeSuite(GEXLoadingTestCase))
+	suite.addTest(unittest.makeSuite(LoadOptionsTestCase))
+	suite.addTest(unittest.makeSuite(ExpatBackendTestCase))
+	return suite
+
+if __name__ == "__main__":
+	unittest.main()
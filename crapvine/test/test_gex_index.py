@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+from crapvine.xml.grapevine_xml import GEX
+from crapvine.xml.gex_index import ChronicleIndex, open_index, index_filename
+from crapvine.xml.vampire_loader import LoadOptions
+from crapvine.test.test_gex import chronicle_xml
+
+class ChronicleFileTestCase(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.filename = os.path.join(self.directory, 'test.gex')
+		f = open(self.filename, 'wb')
+		f.write(chronicle_xml)
+		f.close()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+class ChronicleIndexTestCase(ChronicleFileTestCase):
+
+	def testRanges(self):
+		index = open_index(self.filename)
+		self.assertEqual([e.element for e in index.entries], ['grapevine', 'vampire', 'vampire'])
+		self.assertEqual(index.vampire_names(), ['Marcus', 'Lucia'])
+		lucia = index.read_element(index.by_name['Lucia'])
+		assert lucia.startswith('<vampire name="Lucia"')
+		assert lucia.endswith('</vampire>')
+
+	def testLoadVampire(self):
+		gex = GEX()
+		gex.load_from_file(self.filename)
+		index = open_index(self.filename)
+		for name in ['Marcus', 'Lucia']:
+			vampire = index.load_vampire(name)
+			self.assertEqual(vampire.get_xml(), gex.chronicle_loader.vampires[name].get_xml())
+		self.assertRaises(KeyError, index.load_vampire, 'Nobody')
+
+	def testSidecar(self):
+		index = open_index(self.filename)
+		assert os.path.exists(index_filename(self.filename))
+		saved = ChronicleIndex.read(self.filename)
+		self.assertEqual(saved.digest, index.digest)
+		self.assertEqual([(e.name, e.start, e.end) for e in saved.entries],
+			[(e.name, e.start, e.end) for e in index.entries])
+		assert saved.matches(check_hash=True)
+
+	def testStaleIndexIsRebuilt(self):
+		open_index(self.filename)
+		f = open(self.filename, 'wb')
+		f.write(chronicle_xml.replace('Lucia', 'Lucinda'))
+		f.close()
+		assert not ChronicleIndex.read(self.filename).matches()
+		index = open_index(self.filename)
+		self.assertEqual(index.vampire_names(), ['Marcus', 'Lucinda'])
+		self.assertEqual(index.load_vampire('Lucinda').clan, 'Toreador')
+
+class ParallelLoadTestCase(ChronicleFileTestCase):
+	def testSameAsSingleProcess(self):
+		single = GEX()
+		single.load_from_file(self.filename)
+		for processes in (1, 2):
+			gex = GEX()
+			gex.load_parallel(self.filename, processes)
+			loader = gex.chronicle_loader
+			self.assertEqual(loader.vampires.keys(), single.chronicle_loader.vampires.keys())
+			for name, vampire in single.chronicle_loader.vampires.iteritems():
+				self.assertEqual(loader.vampires[name].get_xml(), vampire.get_xml())
+			self.assertEqual(loader.chronicle.chronicle, 'Test')
+			assert not loader.chronicle.is_dirty()
+
+	def testOptions(self):
+		gex = GEX()
+		gex.load_parallel(self.filename, 2, LoadOptions(names=['Marcus', 'Lucia'],
+			predicate=lambda v: v.clan == 'Toreador', sections=()))
+		vampires = gex.chronicle_loader.vampires
+		self.assertEqual(vampires.keys(), ['Lucia'])
+		self.assertEqual(vampires['Lucia'].traitlists, [])
+
+def suite():
+	suite = unittest.TestSuite()
+	suite.addTest(unittest.makeSuite(ChronicleIndexTestCase))
+	suite.addTest(unittest.makeSuite(ParallelLoadTestCase))
+	return suite
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,69 @@
+import random
+import unittest
+from crapvine.types.vampire import Vampire
+from crapvine.xml.experience import Experience, ExperienceEntry
+from crapvine.xml.ledger import check_ledgers, PackedLedger
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+def make_vampire(name, rows):
+	v = Vampire()
+	v.name = name
+	exp = Experience()
+	for date, type, change in rows:
+		entry = ExperienceEntry()
+		entry.read_attributes({'date': date, 'type': type, 'change': change})
+		exp.add_entry(entry, False)
+	exp.recalculate_from(0, len(exp.entries) - 1)
+	exp.earned = exp.entries[-1].earned if exp.entries else '0'
+	exp.unspent = exp.entries[-1].unspent if exp.entries else '0'
+	v.add_experience(exp)
+	return v
+
+def random_rows(rng, count):
+	return [('%d/1/2007' % (i % 12 + 1), str(rng.randint(0, 6)), str(rng.randint(0, 8)))
+		for i in range(count)]
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class LedgerTestCase(unittest.TestCase):
+	def testReplayMatchesEntries(self):
+		rng = random.Random(7)
+		vampires = [make_vampire('V%d' % (i), random_rows(rng, rng.randint(0, 30)))
+			for i in range(50)]
+		self.assertEqual(check_ledgers(vampires), [])
+		ledger = PackedLedger(vampires)
+		earned, unspent = ledger.replay()
+		expected = [e.get_number('unspent') for v in vampires for e in v.experience.entries]
+		self.assertEqual(unspent.tolist(), expected)
+
+	def testReportsMismatches(self):
+		rows = [('1/1/2007', '0', '10'), ('2/1/2007', '3', '4'), ('3/1/2007', '1', '2')]
+		good = make_vampire('Good', rows)
+		bad = make_vampire('Bad', rows)
+		bad.experience.entries[1].unspent = '7'
+		bad.experience.earned = '9'
+		found = check_ledgers([good, bad])
+		self.assertEqual([(m.name, m.index, m.field) for m in found],
+			[('Bad', None, 'earned'), ('Bad', 1, 'unspent')])
+		self.assertEqual((found[1].stored, found[1].expected), (7.0, 6.0))
+
+	def testWithoutExperience(self):
+		v = Vampire()
+		v.name = 'Nobody'
+		self.assertEqual(check_ledgers([v, make_vampire('Empty', [])]), [])
+
+	def testUnknownType(self):
+		v = make_vampire('Odd', [('1/1/2007', '0', '1')])
+		v.experience.entries[0].type = '9'
+		self.assertRaises(ValueError, check_ledgers, [v])
+
+def suite():
+	suite = unittest.TestSuite()
+	suite.addTest(unittest.makeSuite(LedgerTestCase))
+	return suite
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from xml.sax import parseString
+from crapvine.xml.menu import MenuLoader, MenuItem, MenuModel
+
+menus_xml = """<?xml version="1.0"?>
+<grapevine version="3">
+   <menu name="Physical" abc="yes">
+      <item name="Quick"/>
+      <include name="Common"/>
+      <item name="Brawny"/>
+   </menu>
+   <menu name="Common">
+      <item name="Tough" cost="2"/>
+      <include name="Missing"/>
+   </menu>
+   <menu name="Loop A">
+      <item name="A"/>
+      <include name="Loop B"/>
+   </menu>
+   <menu name="Loop B">
+      <item name="B"/>
+      <include name="Loop A"/>
+   </menu>
+   <menu name="Status, Negative">
+      <include name="Physical"/>
+   </menu>
+</grapevine>"""
+
+def names(menu):
+	return [item.name for item in menu.items]
+
+class MenuExpansionTestCase(unittest.TestCase):
+	def setUp(self):
+		self.loader = MenuLoader()
+		parseString(menus_xml, self.loader)
+
+	def testExpansion(self):
+		self.assertEqual(names(self.loader.get_expanded_menu('Physical')), ['Brawny', 'Quick', 'Tough'])
+		self.assertEqual(names(self.loader.get_expanded_menu('common')), ['Tough'])
+		self.assertEqual(names(self.loader.get_expanded_menu('Negative Status')), ['Quick', 'Tough', 'Brawny'])
+		self.assertEqual(self.loader.get_expanded_menu('Nothing'), None)
+
+	def testCached(self):
+		menu = self.loader.get_expanded_menu('Physical')
+		assert self.loader.get_expanded_menu('Physical') is menu
+		self.assertRaises(AttributeError, menu.add_item, MenuItem('Wiry'))
+		model = MenuModel(menu)
+		self.assertEqual(model.on_get_value(0, 0), '(back):')
+		self.assertEqual(names(menu), ['Brawny', 'Quick', 'Tough'])
+
+	def testCycles(self):
+		self.assertEqual(names(self.loader.get_expanded_menu('Loop A')), ['A', 'B'])
+		self.assertEqual(names(self.loader.get_expanded_menu('Loop B')), ['B', 'A'])
+		self.assertEqual(self.loader.cycles, set([('Loop B', 'Loop A'), ('Loop A', 'Loop B')]))
+
+	def testInvalidation(self):
+		physical = self.loader.get_expanded_menu('Physical')
+		self.loader.get_expanded_menu('Status, Negative')
+		self.loader.menus['Common'].add_item(MenuItem('Wiry'))
+		self.assertEqual(names(self.loader.get_expanded_menu('Physical')), ['Brawny', 'Quick', 'Tough', 'Wiry'])
+		self.assertEqual(names(self.loader.get_expanded_menu('Status, Negative')),
+			['Quick', 'Tough', 'Wiry', 'Brawny'])
+		self.assertEqual(names(physical), ['Brawny', 'Quick', 'Tough'])
+
+	def testLateInclude(self):
+		self.loader.get_expanded_menu('Common')
+		parseString('<grapevine><menu name="Missing"><item name="Found"/></menu></grapevine>', self.loader)
+		self.assertEqual(names(self.loader.get_expanded_menu('Common')), ['Tough', 'Found'])
+
+def suite():
+	suite = unittest.TestSuite()
+	suite.addTest(unittest.makeSuite(MenuExpansionTestCase))
+	return suite
+
+if __name__ == "__main__":
+	unittest.main()
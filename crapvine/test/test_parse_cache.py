@@ -0,0 +1,49 @@
+import os
+import unittest
+from crapvine.xml.grapevine_xml import GEX
+from crapvine.xml.parse_cache import ParseCache
+from crapvine.test.test_gex_index import ChronicleFileTestCase
+
+class ParseCacheTestCase(ChronicleFileTestCase):
+	def setUp(self):
+		ChronicleFileTestCase.setUp(self)
+		self.cache = ParseCache(os.path.join(self.directory, 'cache'))
+
+	def assertWarmLoad(self, backend):
+		cold = GEX(backend)
+		cold.load_from_file(self.filename, cache=self.cache)
+		assert self.cache.load(self.filename) is not None
+		warm = GEX(backend)
+		warm.load_from_file(self.filename, cache=self.cache)
+		loader = warm.chronicle_loader
+		self.assertEqual(loader.vampires.keys(), cold.chronicle_loader.vampires.keys())
+		for name, vampire in cold.chronicle_loader.vampires.iteritems():
+			self.assertEqual(loader.vampires[name].get_xml(), vampire.get_xml())
+			assert not loader.vampires[name].has_changes()
+		self.assertEqual(loader.chronicle.chronicle, 'Test')
+
+	def testWarmLoad(self):
+		self.assertWarmLoad('expat')
+
+	def testWarmLoadSax(self):
+		self.assertWarmLoad('sax')
+
+	def testKeyedByContent(self):
+		GEX().load_from_file(self.filename, cache=self.cache)
+		f = open(self.filename, 'ab')
+		f.write('\n')
+		f.close()
+		self.assertEqual(self.cache.load(self.filename), None)
+
+	def testOtherLayoutIgnored(self):
+		GEX().load_from_file(self.filename, cache=self.cache)
+		self.cache.signature = 'another layout'
+		self.assertEqual(self.cache.load(self.filename), None)
+
+def suite():
+	suite = unittest.TestSuite()
+	suite.addTest(unittest.makeSuite(ParseCacheTestCase))
+	return suite
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from crapvine.xml.string_pool import StringPool
+from crapvine.xml.trait import Trait
+
+class StringPoolTestCase(unittest.TestCase):
+	def testShared(self):
+		pool = StringPool()
+		a = pool.intern(u'Dominate')
+		b = pool.intern(''.join(['Domi', 'nate']))
+		assert a is b
+		assert isinstance(a, str)
+
+	def testBounded(self):
+		pool = StringPool(limit = 3)
+		for name in ['a', 'b', 'c', 'd']:
+			pool.intern(name)
+		assert len(pool) <= 3
+
+	def testLongValuesSkipped(self):
+		pool = StringPool(max_length = 4)
+		pool.intern('Celerity')
+		self.assertEqual(len(pool), 0)
+
+	def testReadAttributes(self):
+		a = Trait()
+		b = Trait()
+		a.read_attributes({u'name': u'Brawl', u'val': u'3'})
+		b.read_attributes({u'name': u'Brawl', u'val': u'3'})
+		assert a.name is b.name
+		assert a.val is b.val
+
+def suite():
+	suite = unittest.TestSuite()
+	suite.addTest(unittest.makeSuite(StringPoolTestCase))
+	return suite
+
+if __name__ == "__main__":
+	unittest.main()
@@ -93,6 +93,236 @@ class TraitListTestCase(unittest.TestCase):
 	def testBasic(self):
 		assert False
 
+class TraitIndexTestCase(unittest.TestCase):
+	def build(self, names, atomic=False):
+		tl = TraitList()
+		tl.atomic = atomic
+		for name in names:
+			t = Trait()
+			t.name = name
+			tl.add_trait(t)
+		return tl
+
+	def testPositions(self):
+		tl = self.build(['Brawl', 'Dodge', 'Melee'])
+		self.assertEqual(list(tl.positions_of('Dodge')), [1])
+		self.assertEqual(list(tl.positions_of('Stealth')), [])
+		t = Trait()
+		t.name = 'Stealth'
+		tl.add_trait(t)
+		self.assertEqual(list(tl.positions_of('Stealth')), [3])
+
+	def testAtomicDuplicates(self):
+		tl = self.build(['Ally', 'Contact', 'Ally'], atomic=True)
+		self.assertEqual(list(tl.positions_of('Ally')), [0, 2])
+
+	def testMergeAndIncrement(self):
+		tl = self.build(['Brawl', 'Dodge', 'Brawl'])
+		self.assertEqual(len(tl.traits), 2)
+		self.assertEqual(tl.traits[0].val, '2')
+		tl.increment_trait('Dodge')
+		self.assertEqual(tl.traits[1].val, '2')
+		self.assertRaises(ValueError, tl.increment_trait, 'Stealth')
+
+	def testDelete(self):
+		tl = self.build(['Brawl', 'Dodge', 'Melee'])
+		tl.decrement_trait('Brawl')
+		self.assertEqual([t.name for t in tl.traits], ['Dodge', 'Melee'])
+		self.assertEqual(list(tl.positions_of('Melee')), [1])
+		tl.increment_trait('Melee')
+		self.assertEqual(tl.traits[1].val, '2')
+
+	def testRenamedInPlace(self):
+		tl = self.build(['Brawl', 'Dodge'])
+		tl.traits[0].name = 'Melee'
+		self.assertEqual(list(tl.positions_of('Brawl')), [])
+		self.assertEqual(list(tl.positions_of('Melee')), [0])
+
+def build_traitlist(traits):
+	tl = TraitList()
+	for name, val in traits:
+		t = Trait()
+		t.name = name
+		t.val = val
+		tl.add_trait(t)
+	return tl
+
+class TraitTotalsTestCase(unittest.TestCase):
+	def testMaintained(self):
+		tl = build_traitlist([('Brawl', '2'), ('Dodge', '1'), ('Lore', '2 or 3')])
+		self.assertEqual(tl.get_total_value(), 4)
+		tl.increment_trait('Dodge')
+		tl.add_trait(build_traitlist([('Brawl', '3')]).traits[0])
+		self.assertEqual(tl.get_total_value(), 8)
+		tl.decrement_trait('Dodge')
+		tl.decrement_trait('Dodge')
+		self.assertEqual(tl.get_total_value(), 6)
+		assert tl.totals_consistent()
+
+	def testDirectEdits(self):
+		tl = build_traitlist([('Brawl', '2'), ('Dodge', '1')])
+		tl.traits[0].val = '4'
+		tl.traits[1].name = 'Melee'
+		tl.traits[1].set_number('val', 3)
+		self.assertEqual(tl.get_total_value(), 7)
+		assert tl.totals_consistent()
+		del tl.traits[0]
+		self.assertEqual(tl.get_total_value(), 3)
+
+	def testReplacedTrait(self):
+		tl = build_traitlist([('Brawl', '2'), ('Dodge', '1')])
+		tl.get_total_value()
+		tl.traits[0] = build_traitlist([('Melee', '5')]).traits[0]
+		assert not tl.totals_consistent()
+		self.assertEqual(tl.get_total_value(), 6)
+		assert tl.totals_consistent()
+
+	def testSharedTrait(self):
+		first = build_traitlist([('Brawl', '2')])
+		second = build_traitlist([('Dodge', '1')])
+		shared = first.traits[0]
+		second.traits.append(shared)
+		self.assertEqual(second.get_total_value(), 3)
+		shared.set_number('val', 4)
+		self.assertEqual(first.get_total_value(), 4)
+		self.assertEqual(second.get_total_value(), 5)
+		assert second.totals_consistent()
+
+	def testAdoptedElsewhere(self):
+		first = build_traitlist([('Brawl', '2'), ('Dodge', '1')])
+		second = build_traitlist([])
+		shared = first.traits[0]
+		self.assertEqual(first.get_total_value(), 3)
+		second.add_trait(shared)
+		self.assertEqual(first.get_total_value(), 3)
+		shared.val = '5'
+		self.assertEqual(first.get_total_value(), 6)
+		self.assertEqual(second.get_total_value(), 5)
+		assert first.totals_consistent()
+
+	def testDisplayTotal(self):
+		tl = build_traitlist([('Ally', '3'), ('Contact', '1')])
+		tl.atomic = True
+		self.assertEqual(tl.get_display_total(), 2)
+		tl.atomic = False
+		self.assertEqual(tl.get_display_total(), 4)
+
+class RenderTestCase(unittest.TestCase):
+	def setUp(self):
+		self.traitlist = build_traitlist([('Brawl', '2'), ('Dodge', '1'), ('Lore', '0')])
+		self.traitlist.traits[0].note = 'fists'
+
+	def testMatchesDisplayStr(self):
+		for display in ['0', '1', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'Default']:
+			self.assertEqual(self.traitlist.render(display, '*'),
+				[t.display_str(display, '*') for t in self.traitlist.traits])
+
+	def testMemoized(self):
+		tl = self.traitlist
+		first = tl.render('2')
+		kept = first[1]
+		tl.increment_trait('Brawl')
+		second = tl.render('2')
+		self.assertEqual(second[0], 'Brawl x3 OOO (fists)')
+		assert second[1] is kept
+		t = Trait()
+		t.name = 'Melee'
+		tl.add_trait(t)
+		tl.decrement_trait('Dodge')
+		self.assertEqual(tl.render('2'), ['Brawl x3 OOO (fists)', 'Lore', 'Melee x1 O'])
+
+	def testRenamed(self):
+		tl = self.traitlist
+		tl.render('1')
+		tl.traits[2].name = 'Occult'
+		self.assertEqual(tl.render('1')[2], 'Occult')
+
+	def testReplaced(self):
+		tl = self.traitlist
+		tl.render('1')
+		tl.traits[1] = build_traitlist([('Melee', '3')]).traits[0]
+		self.assertEqual(tl.render('1')[1], 'Melee x3')
+
+	def testAdoptedElsewhere(self):
+		a = build_traitlist([('Strong', '2')])
+		b = build_traitlist([])
+		t = a.traits[0]
+		a.render('1')
+		b.add_trait(t)
+		a.render('1')
+		t.val = '5'
+		self.assertEqual(a.render('1'), ['Strong x5'])
+		self.assertEqual(b.render('1'), ['Strong x5'])
+
+	def testDirectListChanges(self):
+		tl = self.traitlist
+		tl.render('1')
+		tl.traits.append(build_traitlist([('Melee', '1')]).traits[0])
+		tl.decrement_trait('Melee')
+		self.assertEqual(tl.render('1'), ['Brawl x2 (fists)', 'Dodge x1', 'Lore'])
+		del tl.traits[0]
+		t = Trait()
+		t.name = 'Stealth'
+		tl.add_trait(t)
+		self.assertEqual(tl.render('1'), ['Dodge x1', 'Lore', 'Stealth x1'])
+
+class ChangeJournalTestCase(unittest.TestCase):
+	def setUp(self):
+		self.traitlist = build_traitlist([('Brawl', '2'), ('Dodge', '1')])
+		self.traitlist.clear_dirty()
+
+	def testCoalesced(self):
+		tl = self.traitlist
+		for i in range(3):
+			tl.increment_trait('Brawl')
+		self.assertEqual(tl.trait_changes.entries, [('modify', 'Brawl', '2', '5', '', '')])
+		self.assertEqual(tl.get_changes_strings(), ['Purchased Brawl x3'])
+
+	def testSummary(self):
+		tl = self.traitlist
+		tl.increment_trait('Brawl')
+		tl.decrement_trait('Dodge')
+		t = Trait()
+		t.name = 'Melee'
+		t.val = '2'
+		tl.add_trait(t)
+		tl.increment_trait('Melee')
+		self.assertEqual(tl.get_changes_summary(), 'Purchased Brawl x1, Melee x3; Removed Dodge x1')
+		self.assertEqual(list(tl.get_changes_strings()),
+			['Purchased Brawl x1', 'Removed Dodge x1', 'Added Melee x3'])
+
+	def testCancelled(self):
+		tl = self.traitlist
+		tl.increment_trait('Brawl')
+		tl.decrement_trait('Brawl')
+		t = Trait()
+		t.name = 'Melee'
+		tl.add_trait(t)
+		tl.decrement_trait('Melee')
+		self.assertEqual(tl.trait_changes.entries, [])
+		self.assertEqual(tl.get_changes_summary(), '')
+
+	def testAtomicDuplicates(self):
+		tl = build_traitlist([])
+		tl.atomic = True
+		for i in range(2):
+			t = Trait()
+			t.name = 'Fast'
+			tl.add_trait(t)
+		tl.clear_dirty()
+		tl.increment_trait('Fast')
+		self.assertEqual(tl.trait_changes.entries,
+			[('modify', 'Fast', '1', '2', '', ''), ('modify', 'Fast', '1', '2', '', '')])
+		self.assertEqual(tl.get_changes_summary(), 'Purchased Fast x2')
+		tl.decrement_trait('Fast')
+		self.assertEqual(tl.trait_changes.entries, [])
+
+	def testClearedWithDirty(self):
+		self.traitlist.increment_trait('Dodge')
+		self.traitlist.clear_dirty()
+		self.assertEqual(self.traitlist.trait_changes, None)
+		self.assertEqual(self.traitlist.get_changes_strings().first, None)
+
 def suite():
 	suite = unittest.TestSuite()
 	suite.addTest(TraitListTestCase("testBasic"))
@@ -15,10 +15,8 @@
 ##  You should have received a copy of the GNU General Public License
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import pdb
 from crapvine.xml.grapevine_xml import Attributed, AttributedListModel
 from crapvine.xml.attribute import AttributeBuilder
-from xml.sax.saxutils import escape
 
 class Chronicle(Attributed):
 	text_attrs = ['chronicle', 'website', 'email', 'phone', 'stcommentstart', 'stcommentend', 'randomtraits', 'menupath']
@@ -28,6 +26,8 @@ class Chronicle(Attributed):
 
 	text_children = ['usualplace', 'description']
 
+	instance_attrs = ['calendar', 'awards', 'templates', 'aprsettings', 'players', 'creatures', 'queries', 'items']
+
 	# special kids:
 	# ['calendar' => 1, 'award' => many, 'template' => many, 'aprsettings' => 1, 'player' => many, {creatures} => many, 'query' => many, 'items' => many]
 
@@ -15,10 +15,8 @@
 ##  You should have received a copy of the GNU General Public License
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import pdb
 from crapvine.xml.grapevine_xml import Attributed, AttributedListModel
 from crapvine.xml.attribute import AttributeBuilder
-from xml.sax.saxutils import escape
 
 class Vampire(Attributed):
 	required_attrs = ['name']
@@ -31,6 +29,8 @@ class Vampire(Attributed):
 
 	text_children = ['notes', 'biography']
 
+	instance_attrs = ['traitlists', 'experience']
+
 	attr_menu_map = {'nature' : 'Archetypes', 'demeanor' : 'Archetypes', 'title' : 'Title, Vampire', 'status' : 'Status, Character' }
 
 	def __init__(self):
@@ -38,25 +38,36 @@ class Vampire(Attributed):
 		self.experience = None
 
 	def add_traitlist(self, traitlist):
-		self.traitlists.append(traitlist)
+		self.traitlists.append(self.adopt(traitlist))
+		self.mark_dirty('traitlists')
 
 	def add_experience(self, exp):
-		self.experience = exp
+		self.experience = self.adopt(exp)
+		self.mark_dirty('experience')
+
+	def get_children(self):
+		if self.experience:
+			return [self.experience] + self.traitlists
+		return self.traitlists
 
-	def get_xml(self, indent = ''):
-		ret = '%s<vampire %s>%s' % (indent, self.get_attrs_xml(), "\n")
+	def write_xml(self, out, indent = ''):
+		from xml.sax.saxutils import escape
+		out.write('%s<vampire %s>%s' % (indent, self.get_attrs_xml(), "\n"))
 		local_indent = '%s   ' % (indent)
 		if self.experience:
-			ret += self.experience.get_xml(local_indent)
-			ret += "\n"
-		ret += "\n".join([traitlist.get_xml(local_indent) for traitlist in self.traitlists])
+			self.experience.write_xml(out, local_indent)
+			out.write("\n")
+		separator = ''
+		for traitlist in self.traitlists:
+			out.write(separator)
+			traitlist.write_xml(out, local_indent)
+			separator = "\n"
 
 		for child_name in self.text_children:
 			if self[child_name] != '':
-				ret += "\n"
+				out.write("\n")
 				lines = ['<%s>' % (child_name), '   <![CDATA[%s]]>' % (escape(self[child_name])), '</%s>' % (child_name)]
-				ret += "\n".join(['%s%s' % (local_indent, inny) for inny in lines])
-		ret += '%s%s</vampire>' % ("\n", indent)
-		return ret
+				out.write("\n".join(['%s%s' % (local_indent, inny) for inny in lines]))
+		out.write('%s%s</vampire>' % ("\n", indent))
 	def __str__(self):
 		return self.get_xml()
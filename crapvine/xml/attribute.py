@@ -16,11 +16,10 @@
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import types
+import re
+from operator import attrgetter
 
 from datetime import datetime
-from dateutil.parser import parse
-
-import inspect, types, __builtin__
 
 ############## preliminary: two utility functions #####################
 
@@ -35,7 +34,7 @@ def skip_redundant(iterable, skipset=None):
 def remove_redundant(metaclasses):
 	skipset = set([types.ClassType])
 	for meta in metaclasses: # determines the metaclasses to be skipped
-		skipset.update(inspect.getmro(meta)[1:])
+		skipset.update(meta.__mro__[1:])
 	return tuple(skip_redundant(metaclasses, skipset))
 
 ##################################################################
@@ -75,106 +74,216 @@ def classmaker(left_metas=(), right_metas=()):
 	return make_class
 
 
+def slot_name(name):
+	"The name of the instance slot backing the attribute descriptor for name."
+	return '_attr_%s' % name
+
 class BaseAttr(object):
+	"""Common storage for the attribute descriptors.
+
+	Values live in a __slots__ entry that AttributeBuilder reserves on the
+	owning class, so reading an attribute is a single slot lookup rather than
+	a walk through the instance dictionary."""
 	def __init__(self, default = None, linked_default = None):
-		self.__default = default
-		self.__linked_default = linked_default
-	@property
-	def default(self):
-		return self.__default
-	@property
-	def linked_default(self):
-		return self.__linked_default
+		self.default = default
+		self.linked_default = linked_default
+		self.get_slot = None
+		self.set_slot = None
+	@staticmethod
+	def slot_names(name):
+		return [slot_name(name)]
+	def bind(self, owner):
+		self.dirty_names = frozenset([self.name])
+		slot = getattr(owner, self.inst_attr)
+		self.get_slot = slot.__get__
+		self.set_slot = slot.__set__
+	def slot_defaults(self):
+		# A linked attribute holds None and reads through to the attribute it
+		# is linked to until it is set
+		if self.linked_default:
+			return [(self.set_slot, None)]
+		return [(self.set_slot, self.default)]
+	def __get__(self, instance, owner):
+		if instance is None:
+			return self
+		value = self.get_slot(instance, owner)
+		if value is None and self.linked_default:
+			return getattr(instance, self.linked_default)
+		return value
+	def __set__(self, instance, value):
+		self.load(instance, value)
+		self.mark_dirty(instance)
+	def __delete__(self, instance):
+		raise AttributeError('Cannot delete attribute')
+	def mark_dirty(self, instance):
+		"Records on instance that this attribute has changed since it was loaded."
+		dirty = instance._dirty
+		if dirty is None:
+			instance._dirty = self.dirty_names
+		elif self.name not in dirty:
+			instance._dirty = dirty | self.dirty_names
+		if instance._hash is not None:
+			instance.invalidate_hash()
+		parent = instance._parent
+		if parent is not None:
+			parent.child_changed(instance, self.name)
+	def is_default(self, instance):
+		return self.default == self.__get__(instance, None)
+	def xml_value(self, instance, include_defaults):
+		"Returns the text to save for this attribute, or None to leave it out."
+		value = self.get_slot(instance)
+		if value is None and self.linked_default:
+			value = getattr(instance, self.linked_default)
+		if not include_defaults and value == self.default:
+			return None
+		return value
+	def number(self, instance):
+		value = self.__get__(instance, None)
+		if isinstance(value, (basestring, int, long, float)):
+			return parse_number(value)
+		return None
 
 class TextAttr(BaseAttr):
 	def __init__(self, name, default = '', linked_default = None):
 		BaseAttr.__init__(self, default, linked_default)
 		self.name = name
-		self.inst_attr = "__%s" % name
-	def __set__(self, instance, value):
-		setattr(instance, self.inst_attr, str(value))
-	def __get__(self, instance, owner):
-		if not instance:
-			return self
-		if hasattr(instance, self.inst_attr):
-			return getattr(instance, self.inst_attr)
-		else:
-			if self.linked_default:
-				return getattr(instance, self.linked_default)
-			else:
-				return self.default
-	def __delete__(self, instance):
-		raise AttributeError('Cannot delete attribute')
+		self.inst_attr = slot_name(name)
+	def load(self, instance, value):
+		self.set_slot(instance, str(value))
+
+number_re = re.compile(r'^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$')
+int_re = re.compile(r'^\s*[-+]?\d+\s*$')
+
+def parse_number(value):
+	"Returns value as a float, or None if it is not a plain number."
+	if isinstance(value, (int, long, float)):
+		return float(value)
+	if number_re.match(value):
+		return float(value)
+	return None
+
+def parse_grapevine_number(value):
+	"""Grapevine can store an integer value, a float value, a range specified by
+	by a '-', and two option values.
+
+	returns a float for a plain number, a tuple of the numbers found for a range
+	or option value, or None if value holds no numbers at all"""
+	number = parse_number(value)
+	if number is not None:
+		return number
+	parts = []
+	for separator_str in ['-', ' or ']:
+		for innerval in value.split(separator_str):
+			if number_re.match(innerval):
+				parts.append(float(innerval))
+	if parts:
+		return tuple(parts)
+	return None
+
+integer_texts = {}
+
+def integer_text(number):
+	"""The simplified text for an integral number. The strings are shared
+	between every attribute that holds the same value."""
+	try:
+		return integer_texts[number]
+	except KeyError:
+		if len(integer_texts) >= 4096:
+			integer_texts.clear()
+		text = integer_texts[number] = unicode(int(round(number)))
+		return text
+
+def number_slot_name(name):
+	"The name of the instance slot caching the parsed value of a number attribute."
+	return '_num_%s' % name
 
 class NumberAsTextAttr(BaseAttr):
+	"""A number kept as the text Grapevine wrote, with its parsed value cached
+	alongside in a second slot.
+
+	number() and numbers() hand the cached value to callers so they never have
+	to run the text back through float()."""
 	def __init__(self, name, default = '0', linked_default = None, enforce_as = 'grapevine_float', simplify = True):
 		BaseAttr.__init__(self, default, linked_default)
 		self.name = name
-		self.inst_attr = "__%s" % name
+		self.inst_attr = slot_name(name)
+		self.num_attr = number_slot_name(name)
 		self.enforce_as = enforce_as
 		self.simplify = simplify
-	def __set__(self, instance, value):
+		self.get_num = None
+		self.set_num = None
+	@staticmethod
+	def slot_names(name):
+		return [slot_name(name), number_slot_name(name)]
+	def bind(self, owner):
+		BaseAttr.bind(self, owner)
+		slot = getattr(owner, self.num_attr)
+		self.get_num = slot.__get__
+		self.set_num = slot.__set__
+	def slot_defaults(self):
+		if self.linked_default:
+			return [(self.set_slot, None), (self.set_num, None)]
+		return [(self.set_slot, self.default), (self.set_num, self.__parse(self.default))]
+	def __parse(self, value):
 		if self.enforce_as == 'grapevine_float':
-			if not self.__is_valid_grapevine_float(value):
+			parsed = parse_grapevine_number(value)
+			if parsed is None:
 				raise ValueError('Cannot set attribute to value %s, no valid numbers' % (value))
 		elif self.enforce_as == 'float':
-			try:
-				float(value)
-			except ValueError:
+			parsed = parse_number(value)
+			if parsed is None:
 				raise ValueError('Cannot set attribute to value %s, not a float value' % (value))
 		elif self.enforce_as == 'int':
-			try:
-				int(value)
-			except ValueError:
+			if isinstance(value, (int, long, float)) or int_re.match(value):
+				parsed = float(int(value))
+			else:
 				raise ValueError('Cannot set attribute to value %s, not an int value' %(value))
-		if self.simplify:
-			setattr(instance, self.inst_attr, self.__simplify_float_str(value))
 		else:
-			setattr(instance, self.inst_attr, value)
-	def __get__(self, instance, owner):
-		if not instance:
-			return self
-		if hasattr(instance, self.inst_attr):
-			return getattr(instance, self.inst_attr)
+			parsed = parse_grapevine_number(value)
+		return parsed
+	def load(self, instance, value):
+		parsed = self.__parse(value)
+		if self.simplify and parsed.__class__ is float and parsed == round(parsed):
+			value = integer_text(parsed)
+		self.set_slot(instance, value)
+		self.set_num(instance, parsed)
+	def set_number(self, instance, number):
+		"Stores a float that was calculated rather than read."
+		if self.simplify and number == round(number):
+			text = integer_text(number)
+			number = round(number)
 		else:
-			if self.linked_default:
-				return getattr(instance, self.linked_default)
-			else:
-				return self.default
-	def __is_valid_grapevine_float(self, value):
-		"""Grapevine can store an integer value, a float value, a range specified by
-		by a '-', and two option values. Any number style string needs to be checked
-		for all of these options.
-
-		returns True if value should be accepted by as a grapevine numeric"""
-		try:
-			float(value)
-			return True
-		except ValueError:
-			can_use = False
-			for separator_str in ['-', ' or ']:
-				for innerval in value.split(separator_str):
-					try:
-						float(innerval)
-						can_use = True
-					except ValueError:
-						pass
-			return can_use
-	def __simplify_float_str(self, value):
-		try:
-			if float(value) == round(float(value)):
-				return unicode(int(round(float(value))))
-			else:
-				return value
-		except ValueError:
-			return value
+			text = str(number)
+			number = float(text)
+		self.set_slot(instance, text)
+		self.set_num(instance, number)
+		self.mark_dirty(instance)
+	def __cached(self, instance):
+		parsed = self.get_num(instance)
+		if parsed is None and self.linked_default:
+			return getattr(type(instance), self.linked_default).__cached(instance)
+		return parsed
+	def number(self, instance):
+		"Returns the value as a float, or None if it is a range or option value."
+		parsed = self.__cached(instance)
+		if parsed.__class__ is float:
+			return parsed
+		return None
+	def numbers(self, instance):
+		"Returns every number the value mentions, as a tuple of floats."
+		parsed = self.__cached(instance)
+		if parsed is None:
+			return ()
+		if parsed.__class__ is float:
+			return (parsed,)
+		return parsed
 
 class BoolAttr(BaseAttr):
 	def __init__(self, name, default = False, linked_default = None):
 		BaseAttr.__init__(self, default, linked_default)
 		self.name = name
-		self.inst_attr = "__%s" % name
-	def __set__(self, instance, value):
+		self.inst_attr = slot_name(name)
+	def load(self, instance, value):
 		final_set = False
 		if value == 'yes':
 			final_set = True
@@ -184,56 +293,131 @@ class BoolAttr(BaseAttr):
 			final_set = False
 		elif value:
 			final_set = True
-		setattr(instance, self.inst_attr, final_set)
-	def __get__(self, instance, owner):
-		if not instance:
-			return self
-		if hasattr(instance, self.inst_attr):
-			return getattr(instance, self.inst_attr)
-		else:
-			if self.linked_default:
-				return getattr(instance, self.linked_default)
-			else:
-				return self.default
-	def __delete__(self, instance):
-		raise AttributeError('Cannot delete attribute')
+		self.set_slot(instance, final_set)
+	def xml_value(self, instance, include_defaults):
+		value = self.__get__(instance, None)
+		if not include_defaults and value == self.default:
+			return None
+		return 'yes' if value else 'no'
+
+parsed_dates = {}
+parsed_dates_limit = 4096
+
+def parse_date(text):
+	"""Parses a date string, remembering the result. Chronicles repeat the same
+	session dates across many entries and characters."""
+	try:
+		return parsed_dates[text]
+	except KeyError:
+		# dateutil is slow to import and only needed once a date is read
+		from dateutil.parser import parse
+		if len(parsed_dates) >= parsed_dates_limit:
+			parsed_dates.clear()
+		value = parsed_dates[text] = parse(text)
+		return value
+
+def format_date(date):
+	if date.hour == date.minute == date.second == 0:
+		return date.strftime("%m/%d/%Y")
+	else:
+		return date.strftime("%m/%d/%Y %I:%M:%S %p")
 
 class DateAttr(BaseAttr):
+	"""Keeps date strings as they were read and parses them on first use.
+
+	The slot holds either the original text or a datetime that was assigned
+	directly; raw_text gives back the former so saving can reuse it."""
 	def __init__(self, name, default = None, linked_default = None):
 		BaseAttr.__init__(self, default, linked_default)
 		self.name = name
-		self.inst_attr = "__%s" % name
-	def __set__(self, instance, value):
-		if not isinstance(value, datetime):
-			setattr(instance, self.inst_attr, parse(value))
+		self.inst_attr = slot_name(name)
+	def load(self, instance, value):
+		if value is None or isinstance(value, datetime):
+			self.set_slot(instance, value)
 		else:
-			setattr(instance, self.inst_attr, value)
+			self.set_slot(instance, value.strip())
 	def __get__(self, instance, owner):
-		if not instance:
-			return self
-		if hasattr(instance, self.inst_attr):
-			return getattr(instance, self.inst_attr)
-		else:
-			if self.linked_default:
-				return getattr(instance, self.linked_default)
-			else:
-				return self.default
-	def __delete__(self, instance):
-		raise AttributeError('Cannot delete attribute')
+		value = BaseAttr.__get__(self, instance, owner)
+		if isinstance(value, basestring):
+			return parse_date(value)
+		return value
+	def raw_text(self, instance):
+		"""Returns the unparsed text the value was set from, or None if it was
+		set to a datetime."""
+		value = self.get_slot(instance)
+		if isinstance(value, basestring):
+			return value
+		return None
+	def is_default(self, instance):
+		value = self.get_slot(instance)
+		if isinstance(value, basestring):
+			return False
+		return value == self.default
+	def xml_value(self, instance, include_defaults):
+		value = self.get_slot(instance)
+		if isinstance(value, basestring):
+			return value
+		if not include_defaults and value == self.default:
+			return None
+		return format_date(value)
+
+attribute_class_map = [
+	('required_attrs', TextAttr),
+	('text_attrs', TextAttr),
+	('number_as_text_attrs', NumberAsTextAttr),
+	('bool_attrs', BoolAttr),
+	('date_attrs', DateAttr),
+	('text_children', TextAttr)
+]
+
+# The order attributes are written out in, which differs from the order
+# they are built in. Text children are written as elements, not attributes.
+xml_attribute_order = ['required_attrs', 'text_attrs', 'number_as_text_attrs', 'date_attrs', 'bool_attrs']
+
+def tuple_getter(names):
+	"attrgetter() that returns a tuple however many names it is given."
+	if len(names) == 0:
+		return lambda obj: ()
+	if len(names) == 1:
+		get = attrgetter(names[0])
+		return lambda obj: (get(obj), )
+	return attrgetter(*names)
+
+def class_lookup(bases, dict, name, default):
+	"getattr() for a class that has not been created yet."
+	if name in dict:
+		return dict[name]
+	for base in bases:
+		if hasattr(base, name):
+			return getattr(base, name)
+	return default
 
 class AttributeBuilder(type):
+	"""Turns the attribute lists declared on a class into descriptors.
+
+	Every attribute gets a slot, as does every name listed in instance_attrs,
+	so instances of Attributed classes carry no __dict__."""
+	def __new__(meta, name, bases, dict):
+		if '__slots__' not in dict:
+			slots = []
+			wanted = list(dict.get('instance_attrs', []))
+			for pair in attribute_class_map:
+				for prop in class_lookup(bases, dict, pair[0], []):
+					attr_name = prop if not isinstance(prop, tuple) else prop[0]
+					wanted.extend(pair[1].slot_names(attr_name))
+			for slot in wanted:
+				if slot in slots or [b for b in bases if hasattr(b, slot)]:
+					continue
+				slots.append(slot)
+			dict['__slots__'] = tuple(slots)
+		return super(AttributeBuilder, meta).__new__(meta, name, bases, dict)
+
 	def __init__(cls, name, bases, dict):
 		super(AttributeBuilder, cls).__init__(name, bases, dict)
-		attribute_class_map = [
-			('required_attrs', TextAttr),
-			('text_attrs', TextAttr),
-			('number_as_text_attrs', NumberAsTextAttr),
-			('bool_attrs', BoolAttr),
-			('date_attrs', DateAttr),
-			('text_children', TextAttr)
-		]
 		defaults = getattr(cls, 'defaults', {})
 		linked_defaults = getattr(cls, 'linked_defaults', {})
+		slot_defaults = []
+		built = {}
 		for pair in attribute_class_map:
 			current_desired_properties = getattr(cls, pair[0], [])
 			for prop in current_desired_properties:
@@ -249,4 +433,57 @@ class AttributeBuilder(type):
 				local_kargs.update(extra_kargs)
 
 				new_attr = pair[1](attr_name, **local_kargs)
+				new_attr.bind(cls)
 				setattr(cls, attr_name, new_attr)
+				slot_defaults.extend(new_attr.slot_defaults())
+				built.setdefault(pair[0], []).append(new_attr)
+		cls.slot_defaults = tuple(slot_defaults)
+		cls.compile_xml(built)
+		cls.compile_state(built)
+
+	def compile_state(cls, built):
+		"""Fixes the order in which Attributed.__getstate__ lists slot values.
+
+		state_slots names every slot of the class, base classes first, apart
+		from those listed in transient_slots. read_slots returns their values
+		as a tuple and state_setters holds the matching slot setters.
+		value_names lists every attribute, and read_values returns their
+		stored values, for structural hashing."""
+		value_names = []
+		for pair in attribute_class_map:
+			for attr in built.get(pair[0], []):
+				value_names.append(attr.name)
+		cls.value_names = tuple(value_names)
+		cls.read_values = staticmethod(tuple_getter([slot_name(name) for name in value_names]))
+
+		transient = getattr(cls, 'transient_slots', ())
+		slots = []
+		for klass in reversed(cls.__mro__):
+			for slot in klass.__dict__.get('__slots__', ()):
+				if slot not in slots and slot not in transient:
+					slots.append(slot)
+		cls.state_slots = tuple(slots)
+		cls.state_setters = tuple([getattr(cls, slot).__set__ for slot in slots])
+		cls.read_slots = staticmethod(tuple_getter(slots))
+
+	def compile_xml(cls, built):
+		"""Fixes the attribute reading and writing plans for the class so that
+		Attributed does not rediscover them on every call.
+
+		attr_setters maps an XML attribute name straight to the load method of
+		its descriptor, which sets the value without marking it dirty, and
+		xml_attrs lists the 'name=' prefix and value getter of
+		every attribute to write, in output order."""
+		attr_setters = {}
+		for attrs in built.values():
+			for attr in attrs:
+				attr_setters[attr.name] = attr.load
+		xml_attr_names = []
+		xml_attrs = []
+		for list_name in xml_attribute_order:
+			for attr in built.get(list_name, []):
+				xml_attr_names.append(attr.name)
+				xml_attrs.append(('%s=' % (attr.name), attr.xml_value))
+		cls.attr_setters = attr_setters
+		cls.xml_attr_names = tuple(xml_attr_names)
+		cls.xml_attrs = tuple(xml_attrs)
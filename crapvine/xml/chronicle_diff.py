@@ -0,0 +1,169 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Compares two loaded chronicles using the structural hashes of their
+objects, descending only into subtrees whose hashes differ."""
+
+class Change(object):
+	"""One difference between two chronicles.
+
+	kind is 'added', 'removed' or 'modified' and element the kind of object,
+	such as 'vampire' or 'trait'. path names the object from the character
+	down, and old and new are the objects on each side, None on the side
+	where it is missing. fields lists the attributes that differ when an
+	object's own attributes were modified."""
+	__slots__ = ['kind', 'element', 'path', 'old', 'new', 'fields']
+	def __init__(self, kind, element, path, old, new, fields=()):
+		self.kind = kind
+		self.element = element
+		self.path = path
+		self.old = old
+		self.new = new
+		self.fields = fields
+
+	def __str__(self):
+		text = '%s %s %s' % (self.kind, self.element, '/'.join([unicode(p) for p in self.path]))
+		if self.fields:
+			text += ' (%s)' % (', '.join(self.fields))
+		return text
+	__repr__ = __str__
+
+def changed_fields(old, new):
+	"Returns the names of the attributes whose stored values differ."
+	return tuple([name for name, a, b in
+		zip(old.value_names, old.read_values(old), new.read_values(new)) if a != b])
+
+def keyed(children, key):
+	"""Pairs each child with (key, occurrence), so repeated keys still match
+	up in order."""
+	seen = {}
+	pairs = []
+	for child in children:
+		k = key(child)
+		count = seen.get(k, 0)
+		seen[k] = count + 1
+		pairs.append(((k, count), child))
+	return pairs
+
+def diff_keyed(old_children, new_children, key, element, path, diff_child, changes):
+	new_map = dict(keyed(new_children, key))
+	matched = set()
+	for k, old in keyed(old_children, key):
+		new = new_map.get(k)
+		if new is None:
+			changes.append(Change('removed', element, path + (k[0], ), old, None))
+			continue
+		matched.add(k)
+		if old.structural_hash() != new.structural_hash():
+			diff_child(old, new, element, path + (k[0], ), changes)
+	for k, new in keyed(new_children, key):
+		if k not in matched:
+			changes.append(Change('added', element, path + (k[0], ), None, new))
+
+def diff_attributes(old, new, element, path, changes):
+	if old.attributes_hash() != new.attributes_hash():
+		fields = changed_fields(old, new)
+		if fields:
+			changes.append(Change('modified', element, path, old, new, fields))
+
+def diff_traitlist(old, new, element, path, changes):
+	diff_attributes(old, new, element, path, changes)
+	diff_keyed(old.traits, new.traits, lambda t: t.name, 'trait', path,
+		diff_attributes, changes)
+
+def entry_date(entry):
+	"The date of a ledger entry as it would be saved."
+	return entry.__class__.date.xml_value(entry, True)
+
+def diff_entries(old_entries, new_entries, path, changes):
+	"""Ledger entries have no name, so they are matched by content. Left over
+	entries on the same date are reported as modified, the rest as added or
+	removed."""
+	unmatched = {}
+	for entry in new_entries:
+		unmatched.setdefault(entry.structural_hash(), []).append(entry)
+	removed = []
+	for entry in old_entries:
+		same = unmatched.get(entry.structural_hash())
+		if same:
+			same.pop(0)
+		else:
+			removed.append(entry)
+	leftover = set([id(entry) for same in unmatched.values() for entry in same])
+	added = [entry for entry in new_entries if id(entry) in leftover]
+
+	by_date = {}
+	for entry in added:
+		by_date.setdefault(entry_date(entry), []).append(entry)
+	paired = set()
+	for entry in removed:
+		date = entry_date(entry)
+		candidates = by_date.get(date)
+		if candidates:
+			new = candidates.pop(0)
+			paired.add(id(new))
+			changes.append(Change('modified', 'entry', path + (date, ), entry, new,
+				changed_fields(entry, new)))
+		else:
+			changes.append(Change('removed', 'entry', path + (date, ), entry, None))
+	for entry in added:
+		if id(entry) not in paired:
+			changes.append(Change('added', 'entry', path + (entry_date(entry), ), None, entry))
+
+def diff_experience(old, new, path, changes):
+	if old is None or new is None:
+		if old is not new:
+			kind = 'added' if old is None else 'removed'
+			changes.append(Change(kind, 'experience', path, old, new))
+		return
+	if old.structural_hash() == new.structural_hash():
+		return
+	diff_attributes(old, new, 'experience', path, changes)
+	diff_entries(old.entries, new.entries, path, changes)
+
+def diff_vampire(old, new, path, changes):
+	diff_attributes(old, new, 'vampire', path, changes)
+	diff_experience(old.experience, new.experience, path + ('experience', ), changes)
+	diff_keyed(old.traitlists, new.traitlists, lambda tl: tl.name, 'traitlist', path,
+		diff_traitlist, changes)
+
+def diff_vampires(old, new):
+	"""Returns the Changes between two maps of names to Vampires, such as the
+	vampires of two chronicle loaders."""
+	changes = []
+	for name in sorted(set(old) | set(new)):
+		a = old.get(name)
+		b = new.get(name)
+		if a is None:
+			changes.append(Change('added', 'vampire', (name, ), None, b))
+		elif b is None:
+			changes.append(Change('removed', 'vampire', (name, ), a, None))
+		elif a.structural_hash() != b.structural_hash():
+			diff_vampire(a, b, (name, ), changes)
+	return changes
+
+def diff_chronicles(old, new):
+	"""Returns the Changes between two loaded GEX objects, starting with the
+	chronicle's own attributes."""
+	changes = []
+	old_loader = old.chronicle_loader
+	new_loader = new.chronicle_loader
+	if old_loader.chronicle is not None and new_loader.chronicle is not None:
+		diff_attributes(old_loader.chronicle, new_loader.chronicle, 'chronicle', (), changes)
+	changes.extend(diff_vampires(old_loader.vampires, new_loader.vampires))
+	return changes
@@ -28,7 +28,7 @@ def normalize_whitespace(text):
 
 class ChronicleLoader(ContentHandler):
 	creatures_elements = ['vampire', 'mortal']
-	def __init__(self):
+	def __init__(self, on_vampire=None, options=None):
 		self.chronicle = None
 		self.in_cdata = False
 
@@ -40,7 +40,7 @@ class ChronicleLoader(ContentHandler):
 
 		self.creatures = {}
 		self.reading_creature = ''
-		self.creatures['vampire'] = VampireLoader()
+		self.creatures['vampire'] = VampireLoader(on_vampire, options)
 
 	@property
 	def vampires(self):
@@ -50,12 +50,12 @@ class ChronicleLoader(ContentHandler):
 
 	def startElement(self, name, attrs):
 		if self.reading_creature:
-			if self.creatures[self.reading_creature]:
+			if self.creatures.get(self.reading_creature):
 				self.creatures[self.reading_creature].startElement(name, attrs)
 			return
 		if name in self.creatures_elements:
 			self.reading_creature = name
-			if self.creatures[name]:
+			if self.creatures.get(name):
 				self.creatures[name].startElement(name, attrs)
 			return
 
@@ -72,18 +72,15 @@ class ChronicleLoader(ContentHandler):
 
 	def endElement(self, name):
 		if self.reading_creature:
-			if self.creatures[self.reading_creature]:
+			if self.creatures.get(self.reading_creature):
 				self.creatures[self.reading_creature].endElement(name)
-			return
-		if name in self.creatures_elements:
-			assert self.reading_creature
-			self.reading_creature = ''
-			if self.creatures[name]:
-				self.creatures[name].endElement(name)
+			if name == self.reading_creature:
+				self.reading_creature = ''
 			return
 
 		if name == 'grapevine':
 			assert self.chronicle
+			self.chronicle.clear_dirty()
 
 		elif name == 'usualplace':
 			assert self.reading_usualplace
@@ -101,7 +98,7 @@ class ChronicleLoader(ContentHandler):
 
 	def characters(self, ch):
 		if self.reading_creature:
-			if self.creatures[self.reading_creature]:
+			if self.creatures.get(self.reading_creature):
 				self.creatures[self.reading_creature].characters(ch)
 			return
 
@@ -115,13 +112,13 @@ class ChronicleLoader(ContentHandler):
 
 	def startCDATA(self):
 		if self.reading_creature:
-			if self.creatures[self.reading_creature]:
+			if self.creatures.get(self.reading_creature):
 				self.creatures[self.reading_creature].startCDATA()
 			return
 		self.in_cdata = True
 	def endCDATA(self):
 		if self.reading_creature:
-			if self.creatures[self.reading_creature]:
+			if self.creatures.get(self.reading_creature):
 				self.creatures[self.reading_creature].endCDATA()
 			return
 		self.in_cdata = False
@@ -0,0 +1,430 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Column storage for the entries of an Experience.
+
+EntryColumns keeps every entry's numbers in array buffers and its date and
+reason as positions in tables of shared values, rather than as one
+ExperienceEntry object each. Recalculating the running totals works on the
+buffers directly. EntryView gives an entry the same reading, writing and
+saving interface as ExperienceEntry, so code written against the object
+storage keeps working. See Experience.compact()."""
+
+from array import array
+
+from attribute import integer_text, format_date, parse_date, number_slot_name, tuple_getter
+from experience import ExperienceEntry, totals_read
+from grapevine_xml import quote_attr
+
+number_columns = ('change', 'type', 'earned', 'unspent')
+
+# Where each value sits in ExperienceEntry.read_values()
+number_positions = tuple([(name, ExperienceEntry.value_names.index(name))
+	for name in number_columns])
+date_position = ExperienceEntry.value_names.index('date')
+read_numbers = tuple_getter([number_slot_name(name) for name in number_columns])
+reason_position = ExperienceEntry.value_names.index('reason')
+
+def stored_number(number):
+	"The value set_number() keeps for a calculated number."
+	if number == round(number):
+		return round(number)
+	return float(str(number))
+
+def number_text(number):
+	"The text NumberAsTextAttr keeps for number unless it was read differently."
+	if number == round(number):
+		return integer_text(number)
+	return str(number)
+
+class ValueTable(object):
+	"Numbers each distinct value once, so columns can hold small integers."
+	__slots__ = ['values', 'ids']
+	def __init__(self):
+		self.values = []
+		self.ids = {}
+	def id_of(self, value):
+		try:
+			return self.ids[value]
+		except KeyError:
+			id = self.ids[value] = len(self.values)
+			self.values.append(value)
+			return id
+	def __getstate__(self):
+		return self.values
+	def __setstate__(self, values):
+		self.values = values
+		self.ids = dict([(value, id) for id, value in enumerate(values)])
+
+class ColumnAttr(object):
+	"""Stands in for an ExperienceEntry attribute descriptor on EntryView,
+	reading and writing the view's row of the columns."""
+	def __init__(self, name):
+		self.name = name
+	def __get__(self, view, owner):
+		if view is None:
+			return self
+		return view.columns.get(self.name, view.row)
+	def __set__(self, view, value):
+		view.columns.set(self.name, view.row, value)
+	def xml_value(self, view, include_defaults):
+		return view.columns.text(self.name, view.row)
+	def raw_text(self, view):
+		"As DateAttr.raw_text()."
+		value = view.columns.date_table.values[view.columns.dates[view.row]]
+		if isinstance(value, basestring):
+			return value
+		return None
+	def number(self, view):
+		return float(getattr(view.columns, self.name)[view.row])
+	def set_number(self, view, number):
+		view.columns.set_number(self.name, view.row, number)
+
+class EntryView(object):
+	"""One entry of an EntryColumns, used in place of an ExperienceEntry.
+
+	A view refers to a position, so it follows whatever entry is there after
+	entries are added or removed before it. Changes made through a view are
+	recorded on the Experience, which reports them as its own."""
+	__slots__ = ['columns', 'row']
+
+	reason = ColumnAttr('reason')
+	change = ColumnAttr('change')
+	type = ColumnAttr('type')
+	earned = ColumnAttr('earned')
+	unspent = ColumnAttr('unspent')
+	date = ColumnAttr('date')
+
+	value_names = ExperienceEntry.value_names
+	xml_attr_names = ExperienceEntry.xml_attr_names
+	map_type_to_str = staticmethod(ExperienceEntry.map_type_to_str)
+
+	def __init__(self, columns, row):
+		self.columns = columns
+		self.row = row
+
+	@staticmethod
+	def read_values(view):
+		"The values an ExperienceEntry with the same content would store."
+		columns = view.columns
+		return tuple([columns.stored(name, view.row) for name in view.value_names])
+
+	def entry(self):
+		"Returns a new ExperienceEntry holding the same values."
+		entry = ExperienceEntry()
+		for name in self.value_names:
+			getattr(ExperienceEntry, name).load(entry, self.columns.stored(name, self.row))
+		return entry
+
+	def get_number(self, name):
+		return getattr(self.__class__, name).number(self)
+	def set_number(self, name, number):
+		self.columns.set_number(name, self.row, number)
+	def __setitem__(self, name, value):
+		return setattr(self, name, value)
+	def __getitem__(self, name):
+		return getattr(self, name)
+
+	def calculate_expenditures(self):
+		self.columns.recalculate_row(self.row, None)
+	def calculate_expenditures_from(self, next_entry):
+		self.columns.recalculate_row(self.row, next_entry)
+
+	def get_attrs_xml(self, include_defaults=False):
+		columns = self.columns
+		attrs_strs = []
+		for name in self.xml_attr_names:
+			value = columns.text(name, self.row)
+			if value is not None:
+				attrs_strs.append('%s=%s' % (name, quote_attr(value)))
+		return ' '.join(attrs_strs)
+	def write_xml(self, out, indent=''):
+		out.write('%s<entry %s/>' % (indent, self.get_attrs_xml(True)))
+	def get_xml(self, indent=''):
+		return '%s<entry %s/>' % (indent, self.get_attrs_xml(True))
+	__str__ = get_xml
+
+	def structural_hash(self):
+		return hash((ExperienceEntry.__name__, self.read_values(self), ()))
+	def attributes_hash(self):
+		return hash(self.read_values(self))
+
+	# Changes are tracked by the Experience holding the columns
+	def is_dirty(self):
+		return False
+	def dirty_fields(self):
+		return frozenset()
+	def has_changes(self):
+		return False
+	def clear_dirty(self, deep=False):
+		pass
+	def get_children(self):
+		return ()
+
+class EntryColumns(object):
+	"""The entries of an Experience, stored column-wise.
+
+	change, earned and unspent are array('d') buffers and type an array('b').
+	dates and reasons are array('i') positions in date_table and
+	reason_table. A number read with text other than the usual spelling of
+	its value, such as '2.50', keeps that text in texts so it is saved the
+	way it was read.
+
+	It supports the list operations Experience uses. Indexing returns an
+	EntryView, and insert() and append() copy the values out of an
+	ExperienceEntry or EntryView."""
+	__slots__ = ['owner', 'change', 'type', 'earned', 'unspent', 'dates', 'reasons',
+		'date_table', 'reason_table', 'texts']
+
+	def __init__(self, owner=None):
+		self.owner = owner
+		self.change = array('d')
+		self.type = array('b')
+		self.earned = array('d')
+		self.unspent = array('d')
+		self.dates = array('i')
+		self.reasons = array('i')
+		self.date_table = ValueTable()
+		self.reason_table = ValueTable()
+		self.texts = {}
+
+	def __getstate__(self):
+		return tuple([getattr(self, name) for name in self.__slots__])
+	def __setstate__(self, state):
+		for name, value in zip(self.__slots__, state):
+			setattr(self, name, value)
+
+	def __len__(self):
+		return len(self.type)
+	def __nonzero__(self):
+		return len(self.type) > 0
+	def __getitem__(self, row):
+		if isinstance(row, slice):
+			return [EntryView(self, i) for i in xrange(*row.indices(len(self.type)))]
+		if row < 0:
+			row += len(self.type)
+		if not 0 <= row < len(self.type):
+			raise IndexError('entry index out of range')
+		return EntryView(self, row)
+	def __iter__(self):
+		for row in xrange(len(self.type)):
+			yield EntryView(self, row)
+
+	def __shift_texts(self, row, delta):
+		"Moves the kept texts of the rows from row on by delta."
+		if self.texts:
+			texts = {}
+			for (name, text_row), text in self.texts.iteritems():
+				if text_row >= row:
+					if delta < 0 and text_row < row - delta:
+						continue
+					text_row += delta
+				texts[(name, text_row)] = text
+			self.texts = texts
+
+	def insert(self, row, entry):
+		size = len(self.type)
+		if row < 0:
+			row = max(row + size, 0)
+		row = min(row, size)
+		self.__shift_texts(row, 1)
+		values = entry.read_values(entry)
+		for name, position in number_positions:
+			number = entry.get_number(name)
+			column = getattr(self, name)
+			if column.typecode == 'b':
+				column.insert(row, int(number))
+			else:
+				column.insert(row, number)
+			text = values[position]
+			if text != number_text(number):
+				self.texts[(name, row)] = text
+		self.dates.insert(row, self.date_table.id_of(values[date_position]))
+		self.reasons.insert(row, self.reason_table.id_of(values[reason_position]))
+	def append(self, entry):
+		self.insert(len(self.type), entry)
+	def extend(self, entries):
+		texts = self.texts
+		date_id = self.date_table.id_of
+		reason_id = self.reason_table.id_of
+		row = len(self.type)
+		for entry in entries:
+			if entry.__class__ is not ExperienceEntry:
+				self.insert(row, entry)
+				row += 1
+				continue
+			values = entry.read_values(entry)
+			change, type, earned, unspent = read_numbers(entry)
+			self.change.append(change)
+			self.type.append(int(type))
+			self.earned.append(earned)
+			self.unspent.append(unspent)
+			for name, position in number_positions:
+				text = values[position]
+				if text != number_text(getattr(self, name)[row]):
+					texts[(name, row)] = text
+			self.dates.append(date_id(values[date_position]))
+			self.reasons.append(reason_id(values[reason_position]))
+			row += 1
+	def __delitem__(self, row):
+		if row < 0:
+			row += len(self.type)
+		for name in ('change', 'type', 'earned', 'unspent', 'dates', 'reasons'):
+			del getattr(self, name)[row]
+		self.__shift_texts(row, -1)
+
+	def sort(self, key):
+		"A stable sort of the entries, with key called on a view of each."
+		order = sorted(xrange(len(self.type)), key=lambda row: key(EntryView(self, row)))
+		new_rows = [0] * len(order)
+		for new_row, row in enumerate(order):
+			new_rows[row] = new_row
+		for name in ('change', 'type', 'earned', 'unspent', 'dates', 'reasons'):
+			column = getattr(self, name)
+			setattr(self, name, array(column.typecode, [column[row] for row in order]))
+		self.texts = dict([((name, new_rows[row]), text)
+			for (name, row), text in self.texts.iteritems()])
+
+	def stored(self, name, row):
+		"The value the same ExperienceEntry would hold in the slot for name."
+		if name == 'date':
+			return self.date_table.values[self.dates[row]]
+		if name == 'reason':
+			return self.reason_table.values[self.reasons[row]]
+		text = self.texts.get((name, row))
+		if text is None:
+			return number_text(getattr(self, name)[row])
+		return text
+	def text(self, name, row):
+		"The text saved for name, as the attribute's xml_value() gives it."
+		value = self.stored(name, row)
+		if name == 'date' and not isinstance(value, basestring):
+			if value is None:
+				return None
+			return format_date(value)
+		return value
+	def get(self, name, row):
+		value = self.stored(name, row)
+		if name == 'date' and isinstance(value, basestring):
+			return parse_date(value)
+		return value
+
+	def set(self, name, row, value):
+		"Sets name on row from text or a value, checked as ExperienceEntry would."
+		attr = getattr(ExperienceEntry, name)
+		scratch = ExperienceEntry()
+		attr.load(scratch, value)
+		self.texts.pop((name, row), None)
+		if name == 'date':
+			self.dates[row] = self.date_table.id_of(attr.get_slot(scratch))
+		elif name == 'reason':
+			self.reasons[row] = self.reason_table.id_of(attr.get_slot(scratch))
+		else:
+			number = attr.number(scratch)
+			column = getattr(self, name)
+			if column.typecode == 'b':
+				column[row] = int(number)
+			else:
+				column[row] = number
+			text = attr.get_slot(scratch)
+			if text != number_text(number):
+				self.texts[(name, row)] = text
+		self.changed(name)
+	def set_number(self, name, row, number):
+		self.texts.pop((name, row), None)
+		column = getattr(self, name)
+		if column.typecode == 'b':
+			column[row] = int(number)
+		else:
+			column[row] = stored_number(number)
+		self.changed(name)
+
+	def changed(self, name):
+		"Records a change to the entries on the Experience holding them."
+		owner = self.owner
+		if owner is not None:
+			owner.mark_dirty('entries')
+			owner.child_changed(None, name)
+
+	def recalculate_row(self, row, previous):
+		"""Sets the totals of row from those of previous, an entry or view, or
+		from zero when it is None."""
+		if previous is None:
+			earned = unspent = 0.0
+		else:
+			earned = previous.get_number('earned')
+			unspent = previous.get_number('unspent')
+		self.__replay(row, row + 1, row, earned, unspent)
+
+	def recalculate(self, row, last):
+		"""As Experience.recalculate_from(), working on the buffers. Returns the
+		row after the last one recalculated."""
+		if row > 0:
+			earned = self.earned[row - 1]
+			unspent = self.unspent[row - 1]
+		else:
+			earned = unspent = 0.0
+		return self.__replay(row, len(self.type), last, earned, unspent)
+
+	def __replay(self, row, end, last, e, u):
+		change = self.change
+		types = self.type
+		earned = self.earned
+		unspent = self.unspent
+		start = row
+		unspent_changed = earned_changed = True
+		while row < end:
+			if row > last and not (unspent_changed or earned_changed):
+				break
+			t = types[row]
+			c = change[row]
+			if t == 3:   # Spend
+				u = u - c
+			elif t == 0: # Earn
+				u = u + c
+				e = e + c
+			elif t == 4: # Unspend
+				u = u + c
+			elif t == 1: # Lose
+				u = e
+				e = e - c
+			elif t == 2: # Set Earned To
+				e = c
+			elif t == 5: # Set Unspent To
+				u = c
+			elif t != 6: # Comment
+				raise ValueError("Type must be an integer between 0 and 6")
+			if e != round(e):
+				e = float(str(e))
+			if u != round(u):
+				u = float(str(u))
+			earned[row] = e
+			unspent[row] = u
+			if row > last:
+				changed = (unspent_changed, earned_changed)
+				unspent_from, earned_from = totals_read[t]
+				unspent_changed = unspent_from is not None and changed[unspent_from]
+				earned_changed = earned_from is not None and changed[earned_from]
+			row += 1
+		if self.texts:
+			for name in ('earned', 'unspent'):
+				for text_row in xrange(start, row):
+					self.texts.pop((name, text_row), None)
+		if row > start:
+			self.changed('earned')
+		return row
@@ -0,0 +1,191 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from xml.parsers import expat
+from xml.sax.saxutils import unescape
+
+from vampire_loader import VampireLoader
+from crapvine.types.chronicle import Chronicle
+
+class IgnoredCreature(object):
+	"Stands in for creature types that have no loader, dropping their events."
+	def startElement(self, name, attrs):
+		pass
+	def endElement(self, name):
+		pass
+	def characters(self, ch):
+		pass
+	def startCDATA(self):
+		pass
+	def endCDATA(self):
+		pass
+
+class ExpatChronicleLoader(object):
+	"""Loads a chronicle by driving pyexpat directly instead of going through
+	xml.sax, and builds the same Chronicle and Vampire objects as
+	ChronicleLoader.
+
+	Chronicle level elements are dispatched through handler tables. When a
+	creature element opens, the parser callbacks are pointed straight at
+	that creature's loader until the creature closes, so no event inside a
+	character passes through this class. Loaders for more creature types
+	are added with register_creature()."""
+	creatures_elements = ['vampire', 'werewolf', 'mage', 'changeling', 'wraith',
+		'mummy', 'kueijin', 'hunter', 'demon', 'mortal', 'various']
+
+	def __init__(self, on_vampire=None, options=None):
+		self.chronicle = None
+		self.in_cdata = False
+
+		self.reading_description = False
+		self.current_description = ''
+
+		self.reading_usualplace = False
+		self.current_usualplace = ''
+
+		self.creatures = {}
+		self.reading_creature = ''
+		self.register_creature('vampire', VampireLoader(on_vampire, options))
+		self.ignored_creature = IgnoredCreature()
+
+		self.start_handlers = {
+			'grapevine' : self.start_grapevine,
+			'usualplace' : self.start_usualplace,
+			'description' : self.start_description
+		}
+		self.end_handlers = {
+			'grapevine' : self.end_grapevine,
+			'usualplace' : self.end_usualplace,
+			'description' : self.end_description
+		}
+
+		parser = expat.ParserCreate()
+		parser.buffer_text = True
+		self.parser = parser
+		self.__read_chronicle()
+
+	def register_creature(self, name, loader):
+		"""Hands every event inside name elements to loader, which needs the
+		startElement, endElement, characters, startCDATA and endCDATA
+		methods of a VampireLoader."""
+		self.creatures[name] = loader
+		if name not in self.creatures_elements:
+			self.creatures_elements = self.creatures_elements + [name]
+
+	@property
+	def vampires(self):
+		if self.creatures['vampire']:
+			return self.creatures['vampire'].vampires
+		return None
+
+	def parse(self, source):
+		"Parses a whole chronicle from a filename or an open file."
+		if isinstance(source, basestring):
+			f = open(source, 'rb')
+			try:
+				self.parser.ParseFile(f)
+			finally:
+				f.close()
+		else:
+			self.parser.ParseFile(source)
+
+	def feed(self, data):
+		self.parser.Parse(data, False)
+
+	def close(self):
+		self.parser.Parse('', True)
+
+	def __read_chronicle(self):
+		parser = self.parser
+		parser.StartElementHandler = self.startElement
+		parser.EndElementHandler = self.endElement
+		parser.CharacterDataHandler = self.characters
+		parser.StartCdataSectionHandler = self.startCDATA
+		parser.EndCdataSectionHandler = self.endCDATA
+
+	def __read_creature(self, name):
+		creature = self.creatures.get(name, self.ignored_creature)
+		self.reading_creature = name
+		self.current_creature = creature
+		parser = self.parser
+		parser.StartElementHandler = creature.startElement
+		parser.EndElementHandler = self.__end_creature_element
+		parser.CharacterDataHandler = creature.characters
+		parser.StartCdataSectionHandler = creature.startCDATA
+		parser.EndCdataSectionHandler = creature.endCDATA
+		return creature
+
+	def __end_creature_element(self, name):
+		self.current_creature.endElement(name)
+		if name == self.reading_creature:
+			self.reading_creature = ''
+			self.current_creature = None
+			self.__read_chronicle()
+
+	def startElement(self, name, attrs):
+		if name in self.creatures_elements:
+			self.__read_creature(name).startElement(name, attrs)
+			return
+		handler = self.start_handlers.get(name)
+		if handler:
+			handler(attrs)
+
+	def endElement(self, name):
+		handler = self.end_handlers.get(name)
+		if handler:
+			handler()
+
+	def characters(self, ch):
+		if self.reading_usualplace and self.in_cdata:
+			self.current_usualplace += ch
+		if self.reading_description and self.in_cdata:
+			self.current_description += ch
+
+	def startCDATA(self):
+		self.in_cdata = True
+	def endCDATA(self):
+		self.in_cdata = False
+
+	def start_grapevine(self, attrs):
+		chron = Chronicle()
+		chron.read_attributes(attrs)
+		self.chronicle = chron
+
+	def end_grapevine(self):
+		assert self.chronicle
+		self.chronicle.clear_dirty()
+
+	def start_usualplace(self, attrs):
+		self.reading_usualplace = True
+
+	def end_usualplace(self):
+		assert self.reading_usualplace
+		self.reading_usualplace = False
+		if self.chronicle:
+			self.chronicle['usualplace'] = unescape(self.current_usualplace)
+		self.current_usualplace = ''
+
+	def start_description(self, attrs):
+		self.reading_description = True
+
+	def end_description(self):
+		assert self.reading_description
+		self.reading_description = False
+		if self.chronicle:
+			self.chronicle['description'] = unescape(self.current_description)
+		self.current_description = ''
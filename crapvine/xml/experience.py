@@ -16,11 +16,11 @@
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import operator
-import pdb
+from bisect import bisect_left, bisect_right
 
 # Character Support
 from grapevine_xml import Attributed, AttributedListModel
-from attribute import AttributeBuilder
+from attribute import AttributeBuilder, parse_date
 
 class Experience(AttributedListModel):
 	number_as_text_attrs = [('unspent', {'enforce_as':'float'}),
@@ -28,53 +28,154 @@ class Experience(AttributedListModel):
 	column_attrs = ['date', 'type', 'change', 'unspent', 'earned', 'reason']
 	column_attr_types = [ unicode(), unicode(), unicode(), unicode(), unicode(), unicode() ]
 
+	instance_attrs = ['list', 'entries', 'entry_dates']
+
 	def __init__(self):
 		AttributedListModel.__init__(self)
 		self.list = []
 		self.entries = self.list
+		self.entry_dates = None
 
-	def add_entry(self, entry, calculate_expenditures = True):
-		#print "Appending entry %s" % entry.get_xml()
-		self.entries.append(entry)
+	def __dates(self):
+		"""The dates of the entries, kept alongside them so insertion points can
+		be found with bisect. Rebuilt when missing or out of step."""
+		dates = self.entry_dates
+		if dates is None or len(dates) != len(self.entries):
+			dates = self.entry_dates = [entry.date for entry in self.entries]
+		return dates
 
-		# Signal the addition
-		path = (len(self.list) - 1, )
+	def __own(self, entry):
+		"Adopts entry, first copying it if it is a view of column storage."
+		if not isinstance(entry, Attributed):
+			entry = entry.entry()
+		return self.adopt(entry)
+
+	def __insert(self, entry):
+		"Inserts entry after any entries on or before its date and returns its position."
+		dates = self.__dates()
+		date = entry.date
+		idx = bisect_right(dates, date)
+		dates.insert(idx, date)
+		self.entries.insert(idx, self.__own(entry))
+		self.mark_dirty('entries')
+		path = (idx, )
 		self.row_inserted(path, self.get_iter(path))
+		return idx
 
-		# Sort the entries using date
-		old_list = []
-		old_list.extend(self.entries)
-		self.entries.sort(key=operator.attrgetter('date'))
+	def add_entry(self, entry, calculate_expenditures = True):
+		idx = self.__insert(entry)
+		if calculate_expenditures:
+			self.recalculate_from(idx)
+		self.__update_earned_unspent()
 
-		# Signal the reordering
-		new_indices = []
-		for old_entry in old_list:
-			new_indices.append(self.entries.index(old_entry))
-		self.rows_reordered((), None, new_indices)
-		#print "After-sort entry %s" % entry.get_xml()
+	def add_entries(self, entries, calculate_expenditures = True):
+		"""Adds many entries at once, sorting and recalculating the totals in a
+		single pass. Entries on the same date keep the order they are given in,
+		after any already present, as with repeated add_entry() calls."""
+		get_date = operator.attrgetter('date')
+		added = sorted([self.__own(entry) for entry in entries], key=get_date)
+		if not added:
+			return
+		# Each added entry ends up after the old entries on or before its date
+		# and after the added entries sorted before it
+		dates = self.__dates()
+		positions = [bisect_right(dates, entry.date) + count
+			for count, entry in enumerate(added)]
+		self.entries.extend(added)
+		self.entries.sort(key=get_date)
+		self.entry_dates = None
+		self.mark_dirty('entries')
 
-		# Calculate new earned/unspent totals
-		if calculate_expenditures:
-			idx = self.entries.index(entry)
-			if idx > 0:
-				entry.calculate_expenditures_from(self.entries[idx - 1])
-			else:
-				entry.calculate_expenditures()
-			self.row_changed((idx,), self.get_iter((idx,)))
-			#print "After-calc entry %s" % entry.get_xml()
-
-			for cascade_idx in range(idx + 1, len(self.entries)):
-				self.entries[cascade_idx].calculate_expenditures_from(
-					self.entries[cascade_idx - 1])
-				path = (cascade_idx,)
-				self.row_changed(path, self.get_iter(path))
+		for idx in positions:
+			self.row_inserted((idx, ), self.get_iter((idx, )))
 
+		if calculate_expenditures:
+			self.recalculate_from(positions[0], positions[-1])
 		self.__update_earned_unspent()
 
 	def update_entry(self, path, entry):
+		entry = self.__own(entry)
 		del self.list[path[0]]
+		if self.entry_dates is not None:
+			del self.entry_dates[path[0]]
+		self.mark_dirty('entries')
 		self.row_deleted(path)
-		self.add_entry(entry)
+		idx = self.__insert(entry)
+		self.recalculate_from(min(idx, path[0]), max(idx, path[0]))
+		self.__update_earned_unspent()
+
+	def recalculate_from(self, idx, last=None):
+		"""Recalculates the running earned and unspent totals of the entries from
+		idx on. Entries up to last, which defaults to idx, are taken to be new
+		or edited. Past it, the pass stops as soon as Set Earned To and Set
+		Unspent To entries have replaced both totals, since nothing after that
+		depends on the earlier entries."""
+		if last is None:
+			last = idx
+		if self.entries.__class__ is list:
+			stop = recalculate_entries(self.entries, idx, last)
+		else:
+			stop = self.entries.recalculate(idx, last)
+		for cur in xrange(idx, stop):
+			self.row_changed((cur, ), self.get_iter((cur, )))
+
+	def compact(self):
+		"""Moves the entries into column storage, an EntryColumns, which takes a
+		fraction of the memory and recalculates totals much faster. entries
+		then holds EntryView objects, which are read, changed and saved like
+		ExperienceEntry objects but are not the objects that were added."""
+		if self.entries.__class__ is not list:
+			return
+		from entry_columns import EntryColumns
+		columns = EntryColumns(self)
+		columns.extend(self.entries)
+		self.list = self.entries = columns
+
+	def expand(self):
+		"Moves the entries back out of column storage into ExperienceEntry objects."
+		if self.entries.__class__ is list:
+			return
+		self.list = self.entries = [self.adopt(view.entry()) for view in self.entries]
+
+	def totals_as_of(self, date):
+		"""Returns the earned and unspent totals, as floats, after every entry
+		dated at or before date, which is a datetime or date text. Before the
+		first entry both are 0."""
+		if isinstance(date, basestring):
+			date = parse_date(date)
+		idx = bisect_right(self.__dates(), date)
+		if idx == 0:
+			return (0.0, 0.0)
+		entry = self.entries[idx - 1]
+		return (entry.get_number('earned'), entry.get_number('unspent'))
+
+	def entries_between(self, start=None, end=None):
+		"""Returns the entries dated from start to end, both included. Either
+		bound may be None to leave that side open."""
+		dates = self.__dates()
+		lo = 0
+		hi = len(dates)
+		if start is not None:
+			if isinstance(start, basestring):
+				start = parse_date(start)
+			lo = bisect_left(dates, start)
+		if end is not None:
+			if isinstance(end, basestring):
+				end = parse_date(end)
+			hi = bisect_right(dates, end)
+		return self.entries[lo:hi]
+
+	def child_changed(self, entry, name):
+		if name == 'date':
+			self.entry_dates = None
+
+	def get_children(self):
+		return self.entries
+
+	def adopt_children(self):
+		# Entries in column storage are views that report to their columns
+		if self.entries.__class__ is list:
+			AttributedListModel.adopt_children(self)
 
 	def __update_earned_unspent(self):
 		if len(self.entries) == 0:
@@ -86,14 +187,18 @@ class Experience(AttributedListModel):
 		self.earned  = "%s" % last_entry.earned
 		self.unspent = "%s" % last_entry.unspent
 
-	def get_xml(self, indent=''):
-		end_tag = ">\n" if len(self.entries) > 0 else "/>"
-		ret = '%s<experience %s%s' % (indent, self.get_attrs_xml(), end_tag)
+	def write_xml(self, out, indent=''):
+		if not self.entries:
+			out.write('%s<experience %s/>' % (indent, self.get_attrs_xml()))
+			return
+		out.write('%s<experience %s>\n' % (indent, self.get_attrs_xml()))
 		local_indent = '%s   ' % (indent)
-		ret += "\n".join([entry.get_xml(local_indent) for entry in self.entries])
-		if len(self.entries) > 0:
-			ret += '%s%s</experience>' % ("\n", indent)
-		return ret
+		separator = ''
+		for entry in self.entries:
+			out.write(separator)
+			entry.write_xml(out, local_indent)
+			separator = "\n"
+		out.write('%s%s</experience>' % ("\n", indent))
 	def __str__(self):
 		return self.get_xml()
 
@@ -107,6 +212,43 @@ class Experience(AttributedListModel):
 		else:
 			return super(Experience, self).on_get_value(index, column)
 
+def recalculate_entries(entries, idx, last):
+	"""Recalculates the totals of a list of ExperienceEntry objects for
+	Experience.recalculate_from(), returning the position after the last
+	entry recalculated."""
+	unspent_changed = earned_changed = True
+	cur = idx
+	while cur < len(entries):
+		if cur > last and not (unspent_changed or earned_changed):
+			break
+		entry = entries[cur]
+		if cur > 0:
+			entry.calculate_expenditures_from(entries[cur - 1])
+		else:
+			entry.calculate_expenditures()
+		if cur > last:
+			changed = (unspent_changed, earned_changed)
+			unspent_from, earned_from = totals_read[int(entry.get_number('type'))]
+			unspent_changed = unspent_from is not None and changed[unspent_from]
+			earned_changed = earned_from is not None and changed[earned_from]
+		cur += 1
+	return cur
+
+UNSPENT, EARNED = 0, 1
+
+# For each entry type, the previous totals its new unspent and earned are
+# calculated from, or None for a total it replaces outright. See
+# ExperienceEntry.calculate_expenditures_from().
+totals_read = {
+	0 : (UNSPENT, EARNED),	# Earn
+	1 : (EARNED, EARNED),	# Lose
+	2 : (UNSPENT, None),	# Set Earned To
+	3 : (UNSPENT, EARNED),	# Spend
+	4 : (UNSPENT, EARNED),	# Unspend
+	5 : (None, EARNED),	# Set Unspent To
+	6 : (UNSPENT, EARNED)	# Comment
+}
+
 class ExperienceEntry(Attributed):
 	text_attrs = ['reason']
 	number_as_text_attrs = [('change', {'enforce_as': 'float'}),
@@ -115,8 +257,8 @@ class ExperienceEntry(Attributed):
 		('unspent', {'enforce_as':'float'})]
 	date_attrs = ['date']
 
-	def get_xml(self, indent=''):
-		return '%s<entry %s/>' % (indent, self.get_attrs_xml(include_defaults=True))
+	def write_xml(self, out, indent=''):
+		out.write('%s<entry %s/>' % (indent, self.get_attrs_xml(include_defaults=True)))
 	def __str__(self):
 		return self.get_xml()
 
@@ -126,33 +268,31 @@ class ExperienceEntry(Attributed):
 		tmp_e.earned  = '0'
 		self.calculate_expenditures_from(tmp_e)
 	def calculate_expenditures_from(self, next_entry):
-		t = int(self.type)
-		ne_u = float(next_entry.unspent)
-		ne_e = float(next_entry.earned)
-		s_c  = float(self.change)
-		s_u  = float(self.unspent)
-		s_e  = float(self.earned)
+		t = int(self.get_number('type'))
+		ne_u = next_entry.get_number('unspent')
+		ne_e = next_entry.get_number('earned')
+		s_c  = self.get_number('change')
 		if t == 3:   # Spend
-			self.unspent = str(ne_u - s_c)
-			self.earned = "%s" % next_entry.earned
+			self.set_number('unspent', ne_u - s_c)
+			self.set_number('earned', ne_e)
 		elif t == 0: # Earn
-			self.unspent = str(ne_u + s_c)
-			self.earned  = str(ne_e + s_c)
+			self.set_number('unspent', ne_u + s_c)
+			self.set_number('earned', ne_e + s_c)
 		elif t == 4: # Unspend
-			self.unspent = str(ne_u + s_c)
-			self.earned  = "%s" % next_entry.earned
+			self.set_number('unspent', ne_u + s_c)
+			self.set_number('earned', ne_e)
 		elif t == 1: # Lose
-			self.unspent = "%s" % next_entry.earned
-			self.earned  = str(ne_e - s_c)
+			self.set_number('unspent', ne_e)
+			self.set_number('earned', ne_e - s_c)
 		elif t == 2: # Set Earned To
-			self.unspent = "%s" % next_entry.unspent
-			self.earned  = "%s" % self.change
+			self.set_number('unspent', ne_u)
+			self.set_number('earned', s_c)
 		elif t == 5: # Set Unspent To
-			self.unspent = "%s" % self.change
-			self.earned  = "%s" % next_entry.earned
+			self.set_number('unspent', s_c)
+			self.set_number('earned', ne_e)
 		elif t == 6: # Comment
-			self.unspent = "%s" % next_entry.unspent
-			self.earned  = "%s" % next_entry.earned
+			self.set_number('unspent', ne_u)
+			self.set_number('earned', ne_e)
 		else:
 			raise ValueError("Type must be an integer between 0 and 6")
 
@@ -0,0 +1,242 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import with_statement
+import os
+import mmap
+from xml.parsers import expat
+
+from vampire_loader import VampireLoader
+
+def index_filename(filename):
+	"Returns the name of the sidecar index kept next to a chronicle file."
+	return filename + '.idx'
+
+def file_digest(filename, chunk_size=65536):
+	from hashlib import md5
+	digest = md5()
+	with open(filename, 'rb') as f:
+		while True:
+			data = f.read(chunk_size)
+			if not data:
+				break
+			digest.update(data)
+	return digest.hexdigest()
+
+class IndexEntry(object):
+	"The byte range of one top level element in a chronicle file."
+	__slots__ = ['element', 'name', 'start', 'end']
+	def __init__(self, element, name, start, end=None):
+		self.element = element
+		self.name = name
+		self.start = start
+		self.end = end
+
+class IndexBuilder(object):
+	"""Scans a chronicle with expat, recording where the grapevine start tag
+	and each element directly inside it begin and end. Expat only reports
+	where an event starts, so each range is closed by the next event."""
+	def __init__(self):
+		self.entries = []
+		self.encoding = None
+		self.depth = 0
+		self.pending = None
+
+		parser = expat.ParserCreate()
+		parser.XmlDeclHandler = self.xml_decl
+		parser.StartElementHandler = self.start_element
+		parser.EndElementHandler = self.end_element
+		parser.CommentHandler = self.other_event
+		parser.ProcessingInstructionHandler = self.other_event
+		self.parser = parser
+
+	def __open_range(self, entry):
+		self.pending = entry
+		self.parser.CharacterDataHandler = self.other_event
+
+	def __close_range(self):
+		self.pending.end = self.parser.CurrentByteIndex
+		self.pending = None
+		self.parser.CharacterDataHandler = None
+
+	def xml_decl(self, version, encoding, standalone):
+		self.encoding = encoding
+
+	def start_element(self, name, attrs):
+		if self.pending:
+			self.__close_range()
+		self.depth += 1
+		if self.depth == 1:
+			entry = IndexEntry(name, None, self.parser.CurrentByteIndex)
+			self.entries.append(entry)
+			self.__open_range(entry)
+		elif self.depth == 2:
+			entry = IndexEntry(name, attrs.get('name'), self.parser.CurrentByteIndex)
+			self.entries.append(entry)
+			self.pending = entry
+
+	def end_element(self, name):
+		if self.pending:
+			self.__close_range()
+		if self.depth == 2:
+			self.__open_range(self.entries[-1])
+		self.depth -= 1
+
+	def other_event(self, *args):
+		if self.pending:
+			self.__close_range()
+
+	def feed(self, data):
+		self.parser.Parse(data, False)
+
+	def close(self):
+		self.parser.Parse('', True)
+
+class ChronicleIndex(object):
+	"""A sidecar index of the byte ranges of the top level elements in a
+	chronicle file, so a single character can be loaded by parsing only
+	its own slice of the file.
+
+	The first entry is the grapevine start tag, followed by one entry for
+	each element directly inside it, in document order. An index records
+	the size, modification time and MD5 digest of the file it describes and
+	is only trusted while they match."""
+	magic = 'crapvine-gex-index'
+	version = 1
+
+	def __init__(self, filename, size, mtime, digest, encoding, entries):
+		self.filename = filename
+		self.size = size
+		self.mtime = mtime
+		self.digest = digest
+		self.encoding = encoding
+		self.entries = entries
+		self.by_name = {}
+		for entry in entries:
+			if entry.element == 'vampire' and entry.name is not None:
+				# Later duplicates replace earlier ones, as in a full load
+				self.by_name[entry.name] = entry
+
+	@classmethod
+	def build(cls, filename, chunk_size=65536):
+		"Scans a chronicle file and returns a fresh index of it."
+		from hashlib import md5
+		st = os.stat(filename)
+		digest = md5()
+		builder = IndexBuilder()
+		with open(filename, 'rb') as f:
+			while True:
+				data = f.read(chunk_size)
+				if not data:
+					break
+				digest.update(data)
+				builder.feed(data)
+		builder.close()
+		return cls(filename, st.st_size, st.st_mtime, digest.hexdigest(),
+			builder.encoding, builder.entries)
+
+	@classmethod
+	def read(cls, filename, sidecar=None):
+		"""Reads the sidecar index of a chronicle file. Raises ValueError if it
+		was written by another version of the format."""
+		if sidecar is None:
+			sidecar = index_filename(filename)
+		with open(sidecar, 'rb') as f:
+			lines = f.read().split('\n')
+		header = lines[0].split('\t')
+		if len(header) != 6 or header[0] != cls.magic or header[1] != str(cls.version):
+			raise ValueError('%s is not a version %d chronicle index' % (sidecar, cls.version))
+		entries = []
+		for line in lines[1:]:
+			if not line:
+				continue
+			element, name, start, end = line.split('\t')
+			if name:
+				name = name.decode('unicode_escape')
+			else:
+				name = None
+			entries.append(IndexEntry(element, name, int(start), int(end)))
+		return cls(filename, int(header[2]), float(header[3]), header[4],
+			header[5] or None, entries)
+
+	def write(self, sidecar=None):
+		if sidecar is None:
+			sidecar = index_filename(self.filename)
+		with open(sidecar, 'wb') as f:
+			f.write('%s\t%d\t%d\t%r\t%s\t%s\n' % (self.magic, self.version,
+				self.size, self.mtime, self.digest, self.encoding or ''))
+			for entry in self.entries:
+				name = unicode(entry.name or '').encode('unicode_escape')
+				f.write('%s\t%s\t%d\t%d\n' % (entry.element, name, entry.start, entry.end))
+
+	def matches(self, check_hash=False):
+		"""Returns True if the chronicle file is still the one indexed. Only the
+		size and modification time are compared unless check_hash is set."""
+		try:
+			st = os.stat(self.filename)
+		except OSError:
+			return False
+		if st.st_size != self.size or st.st_mtime != self.mtime:
+			return False
+		return not check_hash or file_digest(self.filename) == self.digest
+
+	def vampire_names(self):
+		return [entry.name for entry in self.entries if entry.element == 'vampire']
+
+	def read_element(self, entry):
+		"Returns the raw bytes of an indexed element, read through mmap."
+		with open(self.filename, 'rb') as f:
+			if self.size == 0:
+				return ''
+			mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			try:
+				return mapped[entry.start:entry.end]
+			finally:
+				mapped.close()
+
+	def load_vampire(self, name):
+		"""Builds the named Vampire by parsing only its own element. Raises
+		KeyError if the chronicle has no such character."""
+		entry = self.by_name[name]
+		loader = VampireLoader()
+		parser = expat.ParserCreate(self.encoding)
+		parser.buffer_text = True
+		parser.StartElementHandler = loader.startElement
+		parser.EndElementHandler = loader.endElement
+		parser.CharacterDataHandler = loader.characters
+		parser.StartCdataSectionHandler = loader.startCDATA
+		parser.EndCdataSectionHandler = loader.endCDATA
+		parser.Parse(self.read_element(entry), True)
+		return loader.vampires[name]
+
+def open_index(filename, check_hash=False):
+	"""Returns an index of a chronicle file, reading its sidecar when that
+	still matches the file and otherwise rebuilding it and writing a new
+	sidecar. A sidecar that cannot be written is not an error."""
+	try:
+		index = ChronicleIndex.read(filename)
+	except (IOError, ValueError):
+		index = None
+	if index is not None and index.matches(check_hash):
+		return index
+	index = ChronicleIndex.build(filename)
+	try:
+		index.write()
+	except IOError:
+		pass
+	return index
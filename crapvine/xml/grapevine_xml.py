@@ -16,65 +16,177 @@
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from __future__ import with_statement
-from xml.sax.saxutils import quoteattr, unescape
+import re
 from xml.sax import make_parser
 from xml.sax.handler import feature_namespaces, property_lexical_handler
-from dateutil.parser import parse
-from datetime import datetime
 
 from attribute import AttributeBuilder, classmaker
+from string_pool import shared_pool
+
+needs_quoting = re.compile('[&<>"\n\r\t]')
+
+def quote_attr(value):
+	"quoteattr() that skips the escaping work for values with nothing to escape"
+	if needs_quoting.search(value) is None:
+		return '"%s"' % (value)
+	# saxutils drags in urllib, so it is only imported once it is needed
+	from xml.sax.saxutils import quoteattr
+	return quoteattr(value)
+
+class ChunkCollector(object):
+	"A file-like object that gathers written chunks, used to build get_xml()."
+	def __init__(self):
+		self.chunks = []
+		self.write = self.chunks.append
+	def getvalue(self):
+		return ''.join(self.chunks)
 
 class Attributed(object):
 	__metaclass__ = AttributeBuilder
+	instance_attrs = ['_dirty', '_parent', '_hash']
+	def __new__(cls, *args, **kwargs):
+		self = object.__new__(cls)
+		for set_slot, default in cls.slot_defaults:
+			set_slot(self, default)
+		self._dirty = None
+		self._parent = None
+		self._hash = None
+		return self
+
+	# The dirty flags, parent link and cached hash are not saved. The hash
+	# comes from the built-in hash() and need not hold in another process.
+	transient_slots = ('_dirty', '_parent', '_hash')
+	state_version = 2
+	def __getstate__(self):
+		"""The compact form used by pickle, copy and the parse cache: the state
+		version and a tuple of every slot value in state_slots order."""
+		return (self.state_version, self.read_slots(self))
+	def __setstate__(self, state):
+		"""Restores a saved state. The object comes back clean, with its hash
+		to be recalculated, and adopts its children again."""
+		self.__restore(state)
+		self.adopt_children()
+	def __copy__(self):
+		"""A shallow copy, which comes back clean. It shares its children with
+		the original, and they go on reporting to the original."""
+		copied = self.__class__.__new__(self.__class__)
+		copied.__restore(self.__getstate__())
+		return copied
+	def __restore(self, state):
+		version, values = state
+		if version != self.state_version or len(values) != len(self.state_slots):
+			raise ValueError('Incompatible saved state for %s' % (self.__class__.__name__))
+		for set_slot, value in zip(self.state_setters, values):
+			set_slot(self, value)
+
 	def read_attributes(self, attrs):
-		for attr in attrs.keys():
-			if hasattr(self, attr):
-				setattr(self, attr, unescape(attrs.get(attr)))
-
-	def __attr_default(self, name):
-		return getattr(self.__class__, name).default == getattr(self, name)
-
-	def __get_attrs_names(self, attrs):
-		list = getattr(self, attrs, [])
-		ret_list = []
-		for elem in list:
-			if isinstance(elem, tuple):
-				ret_list.append(elem[0])
-			else:
-				ret_list.append(elem)
-		return ret_list
-	def __get_required_attrs(self):
-		return self.__get_attrs_names('required_attrs')
-	def __get_text_attrs(self):
-		return self.__get_attrs_names('text_attrs')
-	def __get_number_as_text_attrs(self):
-		return self.__get_attrs_names('number_as_text_attrs')
-	def __get_date_attrs(self):
-		return self.__get_attrs_names('date_attrs')
-	def __get_bool_attrs(self):
-		return self.__get_attrs_names('bool_attrs')
-	def __format_date(self, date):
-		if date.hour == date.minute == date.second == 0:
-			return date.strftime("%m/%d/%Y")
-		else:
-			return date.strftime("%m/%d/%Y %I:%M:%S %p")
+		setters = self.attr_setters
+		intern = shared_pool.intern
+		for name, value in attrs.items():
+			setter = setters.get(name)
+			if setter is not None:
+				if '&' in value:
+					from xml.sax.saxutils import unescape
+					value = unescape(value)
+				setter(self, intern(value))
 
 	def get_attrs_xml(self, include_defaults=False):
-		if include_defaults:
-			is_default = lambda x: False
-		else:
-			is_default = self.__attr_default
 		attrs_strs = []
-		attrs_strs.extend(['%s=%s' % (name, quoteattr(self[name])) for name in self.__get_required_attrs() if not is_default(name)])
-		attrs_strs.extend(['%s=%s' % (name, quoteattr(self[name])) for name in self.__get_text_attrs() if not is_default(name)])
-		attrs_strs.extend(['%s=%s' % (name, quoteattr(getattr(self, name))) for name in self.__get_number_as_text_attrs() if not is_default(name)])
-		attrs_strs.extend(['%s=%s' % (name, quoteattr(self.__format_date(self[name]))) for name in self.__get_date_attrs() if not is_default(name)])
-		for bool_attr in self.__get_bool_attrs():
-			if not is_default(bool_attr):
-				my_bool = 'yes' if self[bool_attr] else 'no'
-				attrs_strs.append('%s="%s"' % (bool_attr, my_bool))
+		for prefix, xml_value in self.xml_attrs:
+			value = xml_value(self, include_defaults)
+			if value is not None:
+				attrs_strs.append(prefix + quote_attr(value))
 		return ' '.join(attrs_strs)
 
+	def mark_dirty(self, name):
+		"""Records that name changed. Attribute descriptors do this themselves;
+		containers call it when their children are added or removed."""
+		if self._dirty is None:
+			self._dirty = frozenset([name])
+		elif name not in self._dirty:
+			self._dirty = self._dirty | frozenset([name])
+		if self._hash is not None:
+			self.invalidate_hash()
+	def dirty_fields(self):
+		"Returns the names of the attributes changed since the object was loaded."
+		if self._dirty is None:
+			return frozenset()
+		return self._dirty
+	def is_dirty(self):
+		return self._dirty is not None
+	def clear_dirty(self, deep=False):
+		self._dirty = None
+		if deep:
+			for child in self.get_children():
+				child.clear_dirty(True)
+	def get_children(self):
+		"Returns the Attributed objects saved inside this one."
+		return ()
+	def adopt(self, child):
+		"""Records that child is held by this object, so that changes to it
+		reach this object's structural hash and child_changed().
+
+		A child reports to one object only. If another object held it, that
+		one is told through child_changed(child, '_parent') and its hash is
+		dropped, since later changes to the child will no longer reach it."""
+		parent = child._parent
+		if parent is not None and parent is not self:
+			parent.invalidate_hash()
+			parent.child_changed(child, '_parent')
+		child._parent = self
+		return child
+	def adopt_children(self):
+		"Adopts every child again, as after a restore."
+		for child in self.get_children():
+			child._parent = self
+	def child_changed(self, child, name):
+		"Called after attribute name of an adopted child is set."
+		pass
+
+	def invalidate_hash(self):
+		"""Drops the cached structural hash of this object and of the objects
+		holding it. An ancestor is never hashed while this one is not, so the
+		walk stops at the first object without a hash."""
+		node = self
+		while node is not None and node._hash is not None:
+			node._hash = None
+			node = node._parent
+
+	def structural_hash(self):
+		"""A Merkle hash of the stored attribute values and, in order, the
+		structural hashes of the children. It is cached until something at or
+		beneath this object changes, so equal hashes let a comparison skip a
+		whole subtree."""
+		if self._hash is None:
+			self._hash = hash((self.__class__.__name__, self.read_values(self),
+				tuple([child.structural_hash() for child in self.get_children()])))
+		return self._hash
+	def attributes_hash(self):
+		"A hash of the stored attribute values alone, leaving out the children."
+		return hash(self.read_values(self))
+	def has_changes(self):
+		"Returns True if this object or anything beneath it has changed."
+		if self._dirty is not None:
+			return True
+		for child in self.get_children():
+			if child.has_changes():
+				return True
+		return False
+
+	def get_xml(self, indent=''):
+		"""Collects the XML streamed by write_xml(out, indent), for the classes
+		that define it, into a string."""
+		out = ChunkCollector()
+		self.write_xml(out, indent)
+		return out.getvalue()
+
+	def get_number(self, name):
+		"""Returns the named attribute as a float without reparsing its text, or
+		None if it is not a plain number."""
+		return getattr(self.__class__, name).number(self)
+	def set_number(self, name, number):
+		getattr(self.__class__, name).set_number(self, number)
+
 	def __setitem__(self, name, value):
 		return setattr(self, name, value)
 	def __getitem__(self, name):
@@ -145,28 +257,149 @@ class AttributedListModel(Attributed):
 		return None
 
 class GEX(object):
-	def __init__(self):
+	"""Loads and saves Grapevine chronicle files.
+
+	backend picks the parser: 'expat' drives pyexpat directly and is the
+	faster of the two, while 'sax' goes through xml.sax and ChronicleLoader.
+	Both build the same objects."""
+	backends = ('expat', 'sax')
+
+	def __init__(self, backend='expat'):
+		if backend not in self.backends:
+			raise ValueError('Unknown parser backend %s' % (backend))
+		self.backend = backend
 		self.filename = None
 		self.chronicle_loader = None
+		self.parser = None
+
+	def __make_parser(self, on_vampire=None, options=None):
+		if self.backend == 'expat':
+			from expat_loader import ExpatChronicleLoader
+			self.chronicle_loader = ExpatChronicleLoader(on_vampire, options)
+			return self.chronicle_loader
 
-	def load_from_file(self, filename):
 		from chronicle_loader import ChronicleLoader
-		self.filename = filename
-		self.chronicle_loader = ChronicleLoader()
-		
+		self.chronicle_loader = ChronicleLoader(on_vampire, options)
+
 		parser = make_parser()
 		parser.setFeature(feature_namespaces, 0)
 		parser.setContentHandler(self.chronicle_loader)
 		parser.setProperty(property_lexical_handler, self.chronicle_loader)
-		#print parser
+		return parser
+
+	def load_from_file(self, filename, options=None, cache=None):
+		"""Loads a chronicle from a file. options is a LoadOptions choosing which
+		characters and sections to build; by default everything is built.
+
+		cache is an optional ParseCache. A full load of a file already in it
+		skips the XML, and a file that is not gets stored once parsed."""
+		self.filename = filename
+		if cache is not None and options is None:
+			from parse_cache import file_digest
+			digest = file_digest(filename)
+			cached = cache.load(filename, digest)
+			if cached is not None:
+				# This sets chronicle_loader; the sax parser it returns is not needed
+				self.__make_parser()
+				self.chronicle_loader.chronicle = cached[0]
+				self.chronicle_loader.creatures['vampire'].vampires = cached[1]
+				return
+		parser = self.__make_parser(options=options)
 		parser.parse(self.filename)
+		if cache is not None and options is None:
+			loader = self.chronicle_loader
+			vampires = loader.vampires
+			cache.store(filename, loader.chronicle,
+				[(name, vampires[name]) for name in loader.creatures['vampire'].added_names],
+				digest)
+
+	def load_parallel(self, filename, processes=None, options=None):
+		"""Loads a chronicle file using a pool of processes, by default one per
+		core, and gives the same result as load_from_file(). See
+		ParallelChronicleLoader for how options are applied."""
+		from parallel_loader import ParallelChronicleLoader
+		self.filename = filename
+		self.chronicle_loader = ParallelChronicleLoader(processes, options)
+		self.chronicle_loader.parse(filename)
+
+	def feed(self, data, options=None):
+		"""Parses the next chunk of a chronicle as it arrives. The first call
+		starts a new chronicle, and only its options are used; call close()
+		once the last chunk is fed."""
+		if self.parser is None:
+			self.filename = None
+			self.parser = self.__make_parser(options=options)
+		try:
+			self.parser.feed(data)
+		except:
+			# A broken parser cannot go on; the next feed() starts afresh
+			self.parser = None
+			raise
+
+	def close(self):
+		"""Finishes an incremental load started with feed(). Closing without
+		feeding anything raises the parser's error for an empty document."""
+		parser = self.parser
+		self.parser = None
+		if parser is None:
+			self.filename = None
+			parser = self.__make_parser()
+			# The sax reader only starts parsing, and so only reports the
+			# missing root element, once something has been fed
+			parser.feed('')
+		parser.close()
+
+	def load_from_stream(self, stream, chunk_size=65536, options=None):
+		"""Loads a chronicle from any object with a read() method, such as a
+		blobstore reader or request body, without copying it to disk first."""
+		self.parser = None
+		while True:
+			data = stream.read(chunk_size)
+			if not data:
+				break
+			self.feed(data, options)
+		self.close()
+
+	def iter_vampires(self, source, chunk_size=65536, options=None):
+		"""Yields each Vampire in a chronicle as soon as its closing tag has been
+		parsed, without keeping it afterwards. source is a filename or an
+		object with a read() method.
+
+		Chronicle level attributes are available from chronicle_loader once
+		iteration is finished."""
+		from collections import deque
+		if isinstance(source, basestring):
+			stream = open(source, 'rb')
+		else:
+			stream = source
+		ready = deque()
+		self.filename = None
+		parser = self.__make_parser(ready.append, options)
+		try:
+			while True:
+				data = stream.read(chunk_size)
+				if not data:
+					break
+				parser.feed(data)
+				while ready:
+					yield ready.popleft()
+			parser.close()
+			while ready:
+				yield ready.popleft()
+		finally:
+			if stream is not source:
+				stream.close()
+
+	def write_contents(self, out):
+		"""Streams the chronicle to the file-like object out, so the whole
+		document never has to be held in memory."""
+		out.write('<?xml version="1.0"?>\n<grapevine version="3">')
+		for c in self.chronicle_loader.vampires.itervalues():
+			out.write("\n")
+			c.write_xml(out, '   ')
+		out.write("\n</grapevine>")
 
 	def save_contents_to_file(self, filename):
-		all_character_xml = [c.get_xml('   ') for c in self.chronicle_loader.vampires.values()]
-		out = ['<?xml version="1.0"?>',
-			'<grapevine version="3">']
-		out.extend(all_character_xml)
-		out.append('</grapevine>')
 		with file(filename, 'w') as f:
-			f.write("\n".join(out))
+			self.write_contents(f)
 
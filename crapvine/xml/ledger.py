@@ -0,0 +1,166 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Checks the stored earned and unspent totals of every character in a
+chronicle against a replay of their experience entries.
+
+The entries of all the characters are packed into NumPy arrays and
+replayed together with segmented running sums, so thousands of characters
+are checked in a few vectorized passes. The replay follows the rules of
+ExperienceEntry.calculate_expenditures_from(). NumPy is an optional
+dependency and is only imported once a ledger is packed."""
+
+EARN, LOSE, SET_EARNED, SPEND, UNSPEND, SET_UNSPENT, COMMENT = range(7)
+
+class Mismatch(object):
+	"""A stored total that disagrees with the replayed ledger.
+
+	name is the character and index the position of the entry in its
+	experience, or None for the totals on the experience element itself.
+	field is 'earned' or 'unspent'."""
+	__slots__ = ['name', 'index', 'field', 'stored', 'expected']
+	def __init__(self, name, index, field, stored, expected):
+		self.name = name
+		self.index = index
+		self.field = field
+		self.stored = stored
+		self.expected = expected
+
+	def __str__(self):
+		if self.index is None:
+			where = 'experience'
+		else:
+			where = 'entry %d' % (self.index)
+		return '%s %s %s: stored %g, expected %g' % (self.name, where, self.field,
+			self.stored, self.expected)
+	__repr__ = __str__
+
+def segmented_sums(numpy, steps, resets, reset_values):
+	"""Running sums of steps that restart from reset_values at every position
+	marked in resets. The first position must be marked."""
+	values = numpy.where(resets, reset_values, steps)
+	sums = numpy.cumsum(values)
+	before = (sums - values)[resets]
+	return sums - before[numpy.cumsum(resets) - 1]
+
+class PackedLedger(object):
+	"""The experience entries of many characters in parallel typed arrays.
+
+	Entries keep their ledger order within each character, and owner holds
+	the position in names of the character each belongs to. Characters
+	without an experience element are left out."""
+	def __init__(self, vampires):
+		import numpy
+		self.numpy = numpy
+		names = []
+		counts = []
+		totals = []
+		types = []
+		changes = []
+		dates = []
+		stored = []
+		for vampire in vampires:
+			exp = vampire.experience
+			if exp is None:
+				continue
+			names.append(vampire.name)
+			counts.append(len(exp.entries))
+			totals.append((exp.get_number('earned'), exp.get_number('unspent')))
+			for entry in exp.entries:
+				types.append(entry.get_number('type'))
+				changes.append(entry.get_number('change'))
+				dates.append(entry.date)
+				stored.append((entry.get_number('earned'), entry.get_number('unspent')))
+
+		self.names = names
+		self.counts = numpy.array(counts, dtype=numpy.intp)
+		self.type = numpy.array(types, dtype=numpy.int8)
+		self.change = numpy.array(changes, dtype=numpy.float64)
+		self.date = numpy.array(dates, dtype='datetime64[s]')
+		self.owner = numpy.repeat(numpy.arange(len(names), dtype=numpy.int32), self.counts)
+		self.starts = numpy.cumsum(self.counts) - self.counts
+		self.first = numpy.zeros(len(types), dtype=bool)
+		self.first[self.starts[self.counts > 0]] = True
+		self.stored = numpy.array(stored, dtype=numpy.float64).reshape((len(stored), 2))
+		self.stored_totals = numpy.array(totals, dtype=numpy.float64).reshape((len(totals), 2))
+
+		bad = (self.type < EARN) | (self.type > COMMENT)
+		if bad.any():
+			raise ValueError('%s has an entry with unknown type %d'
+				% (names[self.owner[bad.argmax()]], self.type[bad.argmax()]))
+
+	def replay(self):
+		"""Returns arrays of the earned and unspent totals after each entry,
+		calculated from the types and changes alone."""
+		numpy = self.numpy
+		t = self.type
+		c = self.change
+		if len(t) == 0:
+			return c.copy(), c.copy()
+
+		earned_steps = numpy.where(t == EARN, c, numpy.where(t == LOSE, -c, 0.0))
+		earned_resets = self.first | (t == SET_EARNED)
+		earned = segmented_sums(numpy, earned_steps, earned_resets,
+			numpy.where(t == SET_EARNED, c, earned_steps))
+
+		# Lose sets unspent to the earned total before the entry
+		earned_before = numpy.empty_like(earned)
+		earned_before[0] = 0.0
+		earned_before[1:] = earned[:-1]
+		earned_before[self.first] = 0.0
+
+		unspent_steps = numpy.where((t == EARN) | (t == UNSPEND), c,
+			numpy.where(t == SPEND, -c, 0.0))
+		unspent_resets = self.first | (t == SET_UNSPENT) | (t == LOSE)
+		unspent = segmented_sums(numpy, unspent_steps, unspent_resets,
+			numpy.where(t == SET_UNSPENT, c,
+				numpy.where(t == LOSE, earned_before, unspent_steps)))
+		return earned, unspent
+
+	def mismatches(self, tolerance=1e-6):
+		"""Returns a Mismatch for every stored total that differs from the
+		replay by more than tolerance, ordered by character and entry."""
+		numpy = self.numpy
+		earned, unspent = self.replay()
+		expected = numpy.column_stack((earned, unspent))
+
+		# The experience element carries the totals after its last entry
+		expected_totals = numpy.zeros_like(self.stored_totals)
+		has_entries = self.counts > 0
+		expected_totals[has_entries] = expected[(self.starts + self.counts - 1)[has_entries]]
+
+		fields = ('earned', 'unspent')
+		found = []
+		rows, cols = numpy.nonzero(~(numpy.abs(self.stored_totals - expected_totals) <= tolerance))
+		for row, col in zip(rows.tolist(), cols.tolist()):
+			found.append((row, -1, col, Mismatch(self.names[row], None, fields[col],
+				float(self.stored_totals[row, col]), float(expected_totals[row, col]))))
+		rows, cols = numpy.nonzero(~(numpy.abs(self.stored - expected) <= tolerance))
+		for row, col in zip(rows.tolist(), cols.tolist()):
+			owner = int(self.owner[row])
+			index = int(row - self.starts[owner])
+			found.append((owner, index, col, Mismatch(self.names[owner], index, fields[col],
+				float(self.stored[row, col]), float(expected[row, col]))))
+		found.sort()
+		return [mismatch for owner, index, col, mismatch in found]
+
+def check_ledgers(vampires, tolerance=1e-6):
+	"""Replays the experience of every Vampire in vampires, for instance
+	chronicle_loader.vampires.itervalues(), and returns the list of stored
+	totals that disagree with it. Needs NumPy."""
+	return PackedLedger(vampires).mismatches(tolerance)
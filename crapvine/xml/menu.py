@@ -16,8 +16,8 @@
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from xml.sax import ContentHandler
+from string_pool import shared_pool
 import string
-import copy
 import operator
 
 class AttributeReader:
@@ -39,7 +39,7 @@ class AttributeReader:
 
 	def text(self, name, default=''):
 		if self.attrs.has_key(name):
-			return self.attrs.get(name)
+			return shared_pool.intern(self.attrs.get(name))
 		return default
 	def t(self, name, default=''):
 		return self.text(name, default)
@@ -61,21 +61,94 @@ def normalize_whitespace(text):
     return ' '.join(text.split())
 
 class MenuLoader(ContentHandler):
+	"""Loads menus and expands their includes.
+
+	Once a document is loaded, resolve() flattens the include graph: flat
+	maps each menu name to the tuple of items it expands to, in order. A
+	menu whose includes loop back to itself is expanded without the include
+	that closes the loop, which is recorded in cycles.
+
+	get_expanded_menu() builds each expanded Menu once and keeps it in
+	expanded. Expanded menus share their items and hold them in a tuple, so
+	they must not be changed. Adding a menu, or adding an item to a loaded
+	one, drops the expansions that depend on it."""
 	def __init__(self):
 		self.menus = {}
 		self.current_menu = None
+		self.flat = {}
+		self.expanded = {}
+		self.includers = None
+		self.cycles = set()
 
 	def add_menu(self, menu):
 		self.menus[menu.name] = menu
+		menu.parent = self
+		self.menu_changed(menu.name)
+
+	def __includers(self):
+		"Maps each menu name to the names of the menus that include it."
+		if self.includers is None:
+			includers = {}
+			for menu in self.menus.itervalues():
+				for item in menu.items:
+					if isinstance(item, MenuReference) and item.tagname == 'include':
+						includers.setdefault(item.reference, set()).add(menu.name)
+			self.includers = includers
+		return self.includers
 
-	def __recursive_item_append(self, core_menu, new_menu):
-		for item in core_menu.items:
+	def menu_changed(self, menu_name):
+		"""Drops the expansions of menu_name and of every menu that includes it,
+		directly or through other menus."""
+		if self.flat or self.expanded:
+			includers = self.__includers()
+			stale = set([menu_name])
+			pending = [menu_name]
+			while pending:
+				for name in includers.get(pending.pop(), ()):
+					if name not in stale:
+						stale.add(name)
+						pending.append(name)
+			for name in stale:
+				self.flat.pop(name, None)
+				self.expanded.pop(name, None)
+			self.cycles = set([(a, b) for a, b in self.cycles if a not in stale])
+		self.includers = None
+
+	def __flatten(self, menu_name, path):
+		"""Returns the items menu_name expands to, and whether the result
+		holds wherever the expansion started. It does not when an include was
+		skipped for leading back to a menu on path, the menus being expanded,
+		so only complete results are kept in flat."""
+		items = self.flat.get(menu_name)
+		if items is not None:
+			return items, True
+		path.append(menu_name)
+		items = []
+		complete = True
+		for item in self.menus[menu_name].items:
 			if isinstance(item, MenuReference) and item.tagname == 'include':
-				print 'Found an include'
-				if self.menus.has_key(item.reference):
-					self.__recursive_item_append(self.menus[item.reference], new_menu)
+				reference = item.reference
+				if reference not in self.menus:
+					continue
+				if reference in path:
+					self.cycles.add((menu_name, reference))
+					complete = False
+					continue
+				included, included_complete = self.__flatten(reference, path)
+				items.extend(included)
+				complete = complete and included_complete
 			else:
-				new_menu.add_item(copy.copy(item))
+				items.append(item)
+		path.pop()
+		items = tuple(items)
+		if complete:
+			self.flat[menu_name] = items
+		return items, complete
+
+	def resolve(self):
+		"Flattens the includes of every menu. Called once a document is loaded."
+		for name in self.menus:
+			self.__flatten(name, [])
 
 	def __find_real_menu_name(self, menu_name):
 		if self.menus.has_key(menu_name):
@@ -93,11 +166,16 @@ class MenuLoader(ContentHandler):
 		real_menu_name = self.__find_real_menu_name(menu_name)
 		if not real_menu_name:
 			return None
+		new_menu = self.expanded.get(real_menu_name)
+		if new_menu is not None:
+			return new_menu
 		core_menu = self.menus[real_menu_name]
 		new_menu = Menu(core_menu.name, core_menu.category, core_menu.alphabetical, core_menu.required, core_menu.display, core_menu.negative, core_menu.autonote)
-		self.__recursive_item_append(core_menu, new_menu)
+		items = self.__flatten(real_menu_name, [])[0]
 		if new_menu.alphabetical:
-			new_menu.items.sort(key=operator.attrgetter('name'))
+			items = tuple(sorted(items, key=operator.attrgetter('name')))
+		new_menu.items = items
+		self.expanded[real_menu_name] = new_menu
 		return new_menu
 
 	def has_menu(self, menu_name):
@@ -107,7 +185,7 @@ class MenuLoader(ContentHandler):
 		if name == 'menu':
 			if not attrs.has_key('name'):
 				return
-			menu = Menu(attrs.get('name'))
+			menu = Menu(shared_pool.intern(attrs.get('name')))
 			r = AttributeReader(attrs)
 			menu.category = r.text('category', '1')
 			menu.alphabetical = r.boolean('abc')
@@ -120,7 +198,7 @@ class MenuLoader(ContentHandler):
 		elif name == 'item':
 			if not attrs.has_key('name'):
 				return
-			item = MenuItem(attrs.get('name'))
+			item = MenuItem(shared_pool.intern(attrs.get('name')))
 			r = AttributeReader(attrs)
 			item.cost = r.text('cost', '1')
 			item.note = r.text('note', '')
@@ -129,7 +207,7 @@ class MenuLoader(ContentHandler):
 		elif name == 'submenu' or name == 'include':
 			if not attrs.has_key('name'):
 				return
-			link = MenuReference(name, attrs.get('name'))
+			link = MenuReference(name, shared_pool.intern(attrs.get('name')))
 			r = AttributeReader(attrs)
 			link.reference = r.text('link', link.name)
 			self.current_menu.add_item(link)
@@ -139,6 +217,9 @@ class MenuLoader(ContentHandler):
 			self.add_menu(self.current_menu)
 			self.current_menu = None
 
+	def endDocument(self):
+		self.resolve()
+
 class Menu:
 	""" Note that negative is whether they values should be calculated as a negative value when computing the base character spend points """
 	def __init__(self, name, category='1', alphabetical=False, required=False, display='0', negative=False, autonote=False):
@@ -150,9 +231,12 @@ class Menu:
 		self.negative = negative
 		self.autonote = autonote
 		self.items = []
+		self.parent = None
 
 	def add_item(self, item):
 		self.items.append(item)
+		if self.parent is not None:
+			self.parent.menu_changed(self.name)
 
 	def get_display_length(self):
 		includes = [inc for inc in self.items if isinstance(inc, MenuReference)]
@@ -211,11 +295,13 @@ class MenuModel():
 	def __init__(self, menu):
 		self.menu = menu
 		assert menu is not None
-		self.menu.items.insert(0, MenuReference('submenu', '(back)', '(back)'))
+		# Expanded menus are shared, so the back link goes in a list of our own
+		self.items = [MenuReference('submenu', '(back)', '(back)')]
+		self.items.extend(menu.items)
 	def get_item(self, index):
-		return self.menu.items[index]
+		return self.items[index]
 	def get_item_from_path(self, path):
-		return self.menu.items[path[0]]
+		return self.items[path[0]]
 	def on_get_flags(self):
 		return None
 	def on_get_n_columns(self):
@@ -228,13 +314,13 @@ class MenuModel():
 		return path[0]
 	def on_get_value(self, index, column):
 		assert column == 0
-		menu_item = self.menu.items[index]
+		menu_item = self.items[index]
 		ret_name = menu_item.name
 		if isinstance(menu_item, MenuReference) and menu_item.tagname == 'submenu':
 			ret_name += ':'
 		return ret_name
 	def on_iter_next(self, index):
-		if index >= (len(self.menu.items) - 1):
+		if index >= (len(self.items) - 1):
 			return None
 		return index + 1
 	def on_iter_children(self, node):
@@ -244,12 +330,12 @@ class MenuModel():
 	def on_iter_n_children(self, iter):
 		if iter:
 			return 0
-		return len(self.menu.items)
+		return len(self.items)
 	def on_iter_nth_child(self, parent, n):
 		if parent:
 			return None
 		try:
-			self.menu.items[n]
+			self.items[n]
 		except IndexError:
 			return None
 		else:
@@ -0,0 +1,140 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import with_statement
+import mmap
+from xml.parsers import expat
+
+from vampire_loader import VampireLoader, LoadOptions
+from expat_loader import ExpatChronicleLoader
+
+def parse_vampires(job):
+	"""Builds the vampires found in the given byte ranges of a chronicle file
+	and returns them in document order. Runs inside the worker processes,
+	so it only takes and returns picklable values."""
+	filename, encoding, ranges, sections, compact_experience = job
+	parsed = []
+	loader = VampireLoader(parsed.append, LoadOptions(sections=sections,
+		compact_experience=compact_experience))
+	parser = expat.ParserCreate(encoding)
+	parser.buffer_text = True
+	parser.StartElementHandler = loader.startElement
+	parser.EndElementHandler = loader.endElement
+	parser.CharacterDataHandler = loader.characters
+	parser.StartCdataSectionHandler = loader.startCDATA
+	parser.EndCdataSectionHandler = loader.endCDATA
+	with open(filename, 'rb') as f:
+		mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		try:
+			# The slices are siblings, so they need a root element around them
+			parser.Parse('<vampires>', False)
+			for start, end in ranges:
+				parser.Parse(mapped[start:end], False)
+			parser.Parse('</vampires>', True)
+		finally:
+			mapped.close()
+	return parsed
+
+def split_jobs(entries, count):
+	"Splits vampire entries into count runs of about the same number of bytes."
+	total = sum(entry.end - entry.start for entry in entries)
+	share = max(1, total / count)
+	jobs = []
+	current = []
+	size = 0
+	for entry in entries:
+		current.append((entry.start, entry.end))
+		size += entry.end - entry.start
+		if size >= share:
+			jobs.append(current)
+			current = []
+			size = 0
+	if current:
+		jobs.append(current)
+	return jobs
+
+class ParallelChronicleLoader(ExpatChronicleLoader):
+	"""Loads a chronicle file with a pool of worker processes.
+
+	The file is split at vampire element boundaries using its ChronicleIndex.
+	Each worker parses a run of characters with VampireLoader, and the
+	results are merged into vampires in document order, so the outcome is
+	the same as a single process load. The chronicle's own elements are
+	parsed here while the workers run.
+
+	options.names is applied before the work is handed out. The predicate is
+	applied as each character comes back, once it is fully built, so it
+	need not be picklable."""
+	def __init__(self, processes=None, options=None):
+		ExpatChronicleLoader.__init__(self)
+		self.processes = processes
+		self.load_options = options
+
+	def parse(self, filename):
+		from gex_index import open_index
+		index = open_index(filename)
+		options = self.load_options or LoadOptions()
+
+		vampires = []
+		for entry in index.entries[1:]:
+			if entry.element != 'vampire':
+				continue
+			if options.names is not None and entry.name not in options.names:
+				continue
+			vampires.append(entry)
+
+		jobs = [(filename, index.encoding, ranges, tuple(options.sections),
+				options.compact_experience)
+			for ranges in split_jobs(vampires, self.__job_count())]
+		pool = None
+		if self.processes != 1 and len(jobs) > 1:
+			from multiprocessing import Pool
+			pool = Pool(self.processes)
+			results = pool.imap(parse_vampires, jobs)
+		else:
+			results = (parse_vampires(job) for job in jobs)
+		try:
+			self.__parse_chronicle(index)
+			loaded = self.vampires
+			predicate = options.predicate
+			for parsed in results:
+				for vampire in parsed:
+					if predicate is None or predicate(vampire):
+						loaded[vampire.name] = vampire
+		finally:
+			if pool is not None:
+				pool.close()
+				pool.join()
+
+	def __job_count(self):
+		if self.processes == 1:
+			return 1
+		from multiprocessing import cpu_count
+		# A few runs per process keeps the workers busy when the characters
+		# are of uneven size
+		return (self.processes or cpu_count()) * 4
+
+	def __parse_chronicle(self, index):
+		header = index.entries[0]
+		if index.encoding:
+			self.feed('<?xml version="1.0" encoding="%s"?>' % (index.encoding))
+		for entry in index.entries:
+			if entry.element not in self.creatures_elements:
+				self.feed(index.read_element(entry))
+		self.feed('</%s>' % (header.element))
+		self.close()
@@ -0,0 +1,90 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from __future__ import with_statement
+import os
+import cPickle
+
+from gex_index import file_digest
+
+def layout_signature():
+	"""Identifies the slot layout of the cached classes, so that a cache
+	written before any of them gained or lost an attribute is never read."""
+	from hashlib import md5
+	from crapvine.types.chronicle import Chronicle
+	from crapvine.types.vampire import Vampire
+	from crapvine.xml.trait import Trait, TraitList
+	from crapvine.xml.experience import Experience, ExperienceEntry
+	layout = [(cls.__name__, cls.state_version, cls.state_slots) for cls in
+		(Chronicle, Vampire, TraitList, Trait, Experience, ExperienceEntry)]
+	return md5(repr(layout)).hexdigest()
+
+class ParseCache(object):
+	"""An on-disk cache of parsed chronicles, so reopening an unchanged file
+	skips the XML entirely.
+
+	Entries are keyed by the MD5 digest of the chronicle file's contents and
+	hold the Chronicle and its vampires pickled through the compact state
+	of Attributed. An entry written by another format_version or another
+	attribute layout is ignored."""
+	format_version = 1
+
+	def __init__(self, directory=None):
+		if directory is None:
+			directory = os.path.join(os.path.expanduser('~'), '.crapvine', 'parse-cache')
+		self.directory = directory
+		self.signature = None
+
+	def __signature(self):
+		if self.signature is None:
+			self.signature = '%d-%s' % (self.format_version, layout_signature())
+		return self.signature
+
+	def path(self, digest):
+		return os.path.join(self.directory, digest + '.cache')
+
+	def load(self, filename, digest=None):
+		"""Returns the cached (chronicle, vampires) for a chronicle file, or
+		None if it has not been cached."""
+		if digest is None:
+			digest = file_digest(filename)
+		try:
+			with open(self.path(digest), 'rb') as f:
+				signature = cPickle.load(f)
+				if signature != self.__signature():
+					return None
+				chronicle, vampires = cPickle.load(f)
+		except (IOError, EOFError, ValueError, cPickle.UnpicklingError):
+			return None
+		return chronicle, dict(vampires)
+
+	def store(self, filename, chronicle, vampires, digest=None):
+		"""Caches a fully loaded chronicle. vampires lists (name, Vampire) pairs
+		in the order the loader added them, so that the map rebuilt from them
+		iterates in the same order as the loader's."""
+		if digest is None:
+			digest = file_digest(filename)
+		if not os.path.isdir(self.directory):
+			os.makedirs(self.directory)
+		path = self.path(digest)
+		# Written under another name first so a reader never sees half a file
+		partial = '%s.%d' % (path, os.getpid())
+		with open(partial, 'wb') as f:
+			cPickle.dump(self.__signature(), f, 2)
+			cPickle.dump((chronicle, vampires), f, 2)
+		os.rename(partial, path)
@@ -0,0 +1,56 @@
+##  This file is part of Crapvine.
+##  
+##  Copyright (C) 2007 Andrew Sayman <lorien420@myrealbox.com>
+##
+##  Crapvine is free software; you can redistribute it and/or modify
+##  it under the terms of the GNU General Public License as published by
+##  the Free Software Foundation; either version 3 of the License, or
+##  (at your option) any later version.
+##
+##  Crapvine is distributed in the hope that it will be useful,
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+##  GNU General Public License for more details.
+##
+##  You should have received a copy of the GNU General Public License
+##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+class StringPool(object):
+	"""Hands out one shared copy of each distinct short string.
+
+	A chronicle repeats trait names, clans, narrators and dates thousands of
+	times. Passing those values through a pool while loading lets every sheet
+	point at the same string object. The pool forgets everything once it holds
+	limit strings, so a long running process never grows it without bound.
+
+	ASCII text is pooled as str, which is what TextAttr stores anyway."""
+	def __init__(self, limit = 65536, max_length = 64):
+		self.limit = limit
+		self.max_length = max_length
+		self.strings = {}
+
+	def intern(self, value):
+		if len(value) > self.max_length:
+			return value
+		try:
+			return self.strings[value]
+		except KeyError:
+			pass
+		if len(self.strings) >= self.limit:
+			self.strings.clear()
+		if isinstance(value, unicode):
+			try:
+				value = value.encode('ascii')
+			except UnicodeError:
+				pass
+		self.strings[value] = value
+		return value
+
+	def clear(self):
+		self.strings.clear()
+
+	def __len__(self):
+		return len(self.strings)
+
+shared_pool = StringPool()
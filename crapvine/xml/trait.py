@@ -16,11 +16,142 @@
 ##  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import copy
-import pdb
+from operator import attrgetter
 
 # Character Support
 from grapevine_xml import Attributed, AttributedListModel
-from attribute import AttributeBuilder
+from attribute import AttributeBuilder, parse_number
+
+def trait_value(trait):
+	"A trait's share of its list's total: its value, or 1 if that is not a plain number."
+	val = trait.get_number('val')
+	if val is None:
+		return 1
+	return val
+
+get_parent = attrgetter('_parent')
+
+def number_text(number):
+	if number == int(number):
+		return '%d' % (number)
+	return '%s' % (number)
+
+class ChangeStrings(list):
+	"The descriptions of a list's changes, in order."
+	@property
+	def first(self):
+		if self:
+			return self[0]
+		return None
+
+class ChangeJournal(object):
+	"""Records the edits made to a TraitList as compact tuples of
+	(op, name, old value, new value, old note, new note), where op is one of
+	ADDED, MODIFIED and DELETED.
+
+	Edits to a trait coalesce with the latest entry for the same trait, so
+	repeated increments leave a single entry running from the first value
+	to the last, and a trait added and then deleted leaves nothing. Traits
+	are told apart by the key given to record(), their name by default;
+	atomic lists can hold several traits of the same name."""
+	ADDED = 'add'
+	MODIFIED = 'modify'
+	DELETED = 'delete'
+	__slots__ = ['entries', 'latest']
+
+	def __init__(self):
+		self.entries = []
+		self.latest = {}
+
+	def record(self, op, name, old_val, new_val, old_note, new_note, key=None):
+		if key is None:
+			key = name
+		prev = self.latest.get(key)
+		if prev is not None and op != self.ADDED:
+			p_op, p_name, p_old_val, p_new_val, p_old_note, p_new_note = self.entries[prev]
+			if p_op != self.DELETED:
+				if op == self.DELETED and p_op == self.ADDED:
+					self.__drop(prev)
+					return
+				if op == self.MODIFIED:
+					op = p_op
+				if op == self.MODIFIED and p_old_val == new_val and p_old_note == new_note:
+					self.__drop(prev)
+					return
+				self.entries[prev] = (op, name, p_old_val, new_val, p_old_note, new_note)
+				return
+		self.latest[key] = len(self.entries)
+		self.entries.append((op, name, old_val, new_val, old_note, new_note))
+
+	def __drop(self, idx):
+		del self.entries[idx]
+		latest = {}
+		for key, at in self.latest.iteritems():
+			if at > idx:
+				latest[key] = at - 1
+			elif at < idx:
+				latest[key] = at
+		self.latest = latest
+
+	def strings(self, display="1"):
+		"""Describes each entry, showing added and deleted traits with the
+		given display code."""
+		strings = ChangeStrings()
+		for op, name, old_val, new_val, old_note, new_note in self.entries:
+			if op == self.ADDED:
+				strings.append('Added %s' % (describe_trait(name, new_val, new_note, display)))
+			elif op == self.DELETED:
+				strings.append('Removed %s' % (describe_trait(name, old_val, old_note, display)))
+			else:
+				delta = value_change(old_val, new_val)
+				if delta > 0:
+					strings.append('Purchased %s x%s' % (name, number_text(delta)))
+				elif delta < 0:
+					strings.append('Removed %s x%s' % (name, number_text(-delta)))
+				else:
+					strings.append('Changed %s' % (describe_trait(name, new_val, new_note, display)))
+		return strings
+
+	def summary(self):
+		"""Sums the journal up as 'Purchased ...; Removed ...', for use as an
+		experience entry reason. Changes to traits of the same name are added
+		up and shown where the first of them was made."""
+		deltas = {}
+		for op, name, old_val, new_val, old_note, new_note in self.entries:
+			if op == self.MODIFIED:
+				deltas[name] = deltas.get(name, 0) + value_change(old_val, new_val)
+		purchased = []
+		removed = []
+		for op, name, old_val, new_val, old_note, new_note in self.entries:
+			if op == self.ADDED:
+				purchased.append(describe_trait(name, new_val, '', '1'))
+			elif op == self.DELETED:
+				removed.append(describe_trait(name, old_val, '', '1'))
+			else:
+				delta = deltas.pop(name, 0)
+				if delta > 0:
+					purchased.append('%s x%s' % (name, number_text(delta)))
+				elif delta < 0:
+					removed.append('%s x%s' % (name, number_text(-delta)))
+		parts = []
+		if purchased:
+			parts.append('Purchased %s' % (', '.join(purchased)))
+		if removed:
+			parts.append('Removed %s' % (', '.join(removed)))
+		return '; '.join(parts)
+
+def value_change(old_val, new_val):
+	"How far a trait's value moved, or 0 if either side is not a plain number."
+	old = parse_number(old_val)
+	new = parse_number(new_val)
+	if old is None or new is None:
+		return 0
+	return new - old
+
+def describe_trait(name, val, note, display):
+	t = Trait()
+	t.read_attributes({'name': name, 'val': val, 'note': note or ''})
+	return t.display_str(display)
 
 class TraitList(AttributedListModel):
 	required_attrs = ['name']
@@ -33,11 +164,21 @@ class TraitList(AttributedListModel):
 
 	text_children = []
 
+	instance_attrs = ['list', 'traits', 'trait_changes', 'name_index', 'indexed_length',
+		'trait_values', 'counted_traits', 'value_total', 'rendered', 'rendered_traits']
+
 	def __init__(self):
 		AttributedListModel.__init__(self)
 		self.list = []
 		self.traits = self.list
 		self.trait_changes = None
+		self.name_index = None
+		self.indexed_length = 0
+		self.trait_values = []
+		self.counted_traits = []
+		self.value_total = 0
+		self.rendered = None
+		self.rendered_traits = None
 
 	def add_menu_item(self, menu_item):
 		t = Trait()
@@ -46,86 +187,233 @@ class TraitList(AttributedListModel):
 		t.val  = copy.copy(menu_item.cost)
 		self.add_trait(t)
 
+	def __rebuild_index(self):
+		index = {}
+		for idx, t in enumerate(self.traits):
+			index.setdefault(t.name, []).append(idx)
+		self.name_index = index
+		self.indexed_length = len(self.traits)
+		return index
+
+	def positions_of(self, trait_name):
+		"""Returns the positions of the traits called trait_name, in order.
+
+		The name index is kept up to date by appends and rebuilt after a
+		delete, or when a trait at an indexed position no longer has the
+		indexed name."""
+		index = self.name_index
+		if index is None or self.indexed_length != len(self.traits):
+			index = self.__rebuild_index()
+		positions = index.get(trait_name, ())
+		traits = self.traits
+		for idx in positions:
+			if traits[idx].name != trait_name:
+				positions = self.__rebuild_index().get(trait_name, ())
+				break
+		return positions
+
+	def __append_trait(self, trait):
+		index = self.name_index
+		if index is not None and self.indexed_length == len(self.traits):
+			index.setdefault(trait.name, []).append(len(self.traits))
+			self.indexed_length += 1
+		values = self.trait_values
+		if values is not None and len(values) == len(self.traits):
+			value = trait_value(trait)
+			values.append(value)
+			self.counted_traits.append(trait)
+			self.value_total += value
+		rendered_traits = self.rendered_traits
+		if rendered_traits is not None:
+			if len(rendered_traits) == len(self.traits):
+				for lines in self.rendered.itervalues():
+					lines.append(None)
+				rendered_traits.append(trait)
+			else:
+				self.rendered = self.rendered_traits = None
+		self.traits.append(self.adopt(trait))
+		self.mark_dirty('traits')
+		self.__journal(ChangeJournal.ADDED, trait, trait.name, None, trait.val, None, trait.note)
+		path = (len(self.traits) - 1, )
+		self.row_inserted(path, self.get_iter(path))
+
 	def add_trait(self, trait):
 		if self.atomic:
-			self.traits.append(trait)
-			self.__added_trait(trait)
-			path = (len(self.traits) - 1, )
-			self.row_inserted(path, self.get_iter(path))
-		else:
-			if trait.name in [t.name for t in self.traits]:
-				for en in enumerate(self.traits):
-					t = en[1]
-					if trait.name == t.name:
-						original_trait = copy.copy(t)
-						idx = en[0]
-						try:
-							t.val = str(float(t.val) + float(trait.val))
-						except ValueError:
-							t.val = '2'
-						if t.note == '':
-							t.note = trait.note
-						modified_trait = copy.copy(t)
-						self.__modified_trait(original_trait, modified_trait)
-						path = (idx, )
-						self.row_changed(path, self.get_iter(path))
+			self.__append_trait(trait)
+			return
+		positions = self.positions_of(trait.name)
+		if not positions:
+			self.__append_trait(trait)
+			return
+		for idx in positions:
+			t = self.traits[idx]
+			old_val, old_note = t.val, t.note
+			current = t.get_number('val')
+			added = trait.get_number('val')
+			if current is None or added is None:
+				t.val = '2'
 			else:
-				self.traits.append(trait)
-				self.__added_trait(trait)
-				path = (len(self.traits) - 1, )
-				self.row_inserted(path, self.get_iter(path))
+				t.set_number('val', current + added)
+			if t.note == '':
+				t.note = trait.note
+			self.__journal(ChangeJournal.MODIFIED, t, t.name, old_val, t.val, old_note, t.note)
+			path = (idx, )
+			self.row_changed(path, self.get_iter(path))
 
 	def increment_trait(self, trait_name):
-		if trait_name in [t.name for t in self.traits]:
-			for en in enumerate(self.traits):
-				t = en[1]
-				if trait_name == t.name:
-					idx = en[0]
-					try:
-						t.val = str(float(t.val) + 1)
-					except ValueError:
-						t.val = '1'
-					self.__incremented_trait(t)
-					path = (idx, )
-					self.row_changed(path, self.get_iter(path))
-		else:
+		positions = self.positions_of(trait_name)
+		if not positions:
 			raise ValueError('Unknown trait')
+		for idx in positions:
+			t = self.traits[idx]
+			old_val = t.val
+			current = t.get_number('val')
+			if current is None:
+				t.val = '1'
+			else:
+				t.set_number('val', current + 1)
+			self.__journal(ChangeJournal.MODIFIED, t, t.name, old_val, t.val, t.note, t.note)
+			path = (idx, )
+			self.row_changed(path, self.get_iter(path))
 
 	def decrement_trait(self, trait_name):
-		if trait_name in [t.name for t in self.traits]:
-			for en in enumerate(self.traits):
-				t = en[1]
-				if trait_name == t.name:
-					idx = en[0]
-					original_trait = copy.copy(t)
-					if t.val == '1':
-						del self.traits[idx]
-						self.__deleted_trait(original_trait)
-						path = (idx, )
-						self.row_deleted(path)
+		positions = self.positions_of(trait_name)
+		if not positions:
+			raise ValueError('Unknown trait')
+		# Last first, so deleting a trait does not move the ones still to come
+		for idx in reversed(positions):
+			t = self.traits[idx]
+			if t.val == '1':
+				values = self.trait_values
+				if values is not None and len(values) == len(self.traits):
+					self.value_total -= values.pop(idx)
+					del self.counted_traits[idx]
+				rendered_traits = self.rendered_traits
+				if rendered_traits is not None:
+					if len(rendered_traits) == len(self.traits):
+						for lines in self.rendered.itervalues():
+							del lines[idx]
+						del rendered_traits[idx]
 					else:
-						try:
-							t.val = str(float(t.val) - 1)
-						except ValueError:
-							t.val = '1'
-						self.__decremented_trait(t)
-						path = (idx, )
-						self.row_changed(path, self.get_iter(path))
+						self.rendered = self.rendered_traits = None
+				del self.traits[idx]
+				t._parent = None
+				self.name_index = None
+				self.mark_dirty('traits')
+				self.__journal(ChangeJournal.DELETED, t, t.name, t.val, None, t.note, None)
+				path = (idx, )
+				self.row_deleted(path)
+			else:
+				old_val = t.val
+				current = t.get_number('val')
+				if current is None:
+					t.val = '1'
+				else:
+					t.set_number('val', current - 1)
+				self.__journal(ChangeJournal.MODIFIED, t, t.name, old_val, t.val, t.note, t.note)
+				path = (idx, )
+				self.row_changed(path, self.get_iter(path))
+
+	def child_changed(self, trait, name):
+		if name == '_parent':
+			# Another list took the trait over, and only it hears of changes now
+			self.trait_values = self.counted_traits = None
+			self.rendered = self.rendered_traits = None
+			return
+		if name == 'name':
+			self.name_index = None
+		idx = self.__position(trait)
+		rendered_traits = self.rendered_traits
+		if rendered_traits is not None:
+			if idx is not None and idx < len(rendered_traits) and rendered_traits[idx] is trait:
+				for lines in self.rendered.itervalues():
+					lines[idx] = None
+			else:
+				self.rendered = self.rendered_traits = None
+		if idx is None:
+			return
+		values = self.trait_values
+		if name == 'val' and values is not None and len(values) == len(self.traits):
+			value = trait_value(trait)
+			self.value_total += value - values[idx]
+			values[idx] = value
+
+	def __position(self, trait):
+		traits = self.traits
+		for idx in self.positions_of(trait.name):
+			if traits[idx] is trait:
+				return idx
+		return None
+
+	def render(self, display="1", dot="O"):
+		"""Returns the display strings of all the traits, in order, for one of
+		Grapevine's display codes.
+
+		Each trait's string is remembered until that trait changes, so
+		rendering an unchanged list again costs next to nothing. The list
+		returned is shared with later calls and must not be modified.
+
+		The remembered strings are checked against the traits by identity, so
+		traits put into the list directly are rendered afresh. A list holding
+		a trait that another list has taken over is not told of its changes,
+		and renders every trait on every call."""
+		traits = self.traits
+		formatter = display_formatters.get(display, display_unknown)
+		rendered = self.rendered
+		if rendered is None or self.rendered_traits != traits:
+			self.rendered = self.rendered_traits = None
+			if map(get_parent, traits).count(self) != len(traits):
+				return [formatter(t, dot) for t in traits]
+			rendered = self.rendered = {}
+			self.rendered_traits = list(traits)
+		key = (display, dot)
+		lines = rendered.get(key)
+		if lines is None:
+			lines = rendered[key] = [formatter(t, dot) for t in traits]
+		elif None in lines:
+			for idx, line in enumerate(lines):
+				if line is None:
+					lines[idx] = formatter(traits[idx], dot)
+		return lines
+
+	def __recount(self):
+		traits = self.traits
+		values = [trait_value(t) for t in traits]
+		self.value_total = sum(values)
+		if map(get_parent, traits).count(self) == len(traits):
+			self.trait_values = values
+			self.counted_traits = list(traits)
 		else:
-			raise ValueError('Unknown trait')
+			# Some trait reports its changes to another list, so count again
+			# on every call
+			self.trait_values = self.counted_traits = None
+
+	def __counts_current(self):
+		"""Whether trait_values still holds the values of the traits, with the
+		same trait objects in the same places."""
+		return self.trait_values is not None and self.counted_traits == self.traits
 
 	def get_total_value(self):
-		sum = 0
-		for t in self.traits:
-			try:
-				sum += float(t.val)
-			except ValueError:
-				sum += 1
-			except TypeError, e:
-				print t.val.__class__
-				print t.val
-				raise e
-		return sum
+		"""Returns the sum of the trait values, counting a trait whose value is
+		not a plain number as 1.
+
+		The total is kept up to date as traits are added, changed and deleted.
+		Each call is still linear: it compares the traits list with the one
+		counted, by identity, so that traits put into the list directly are
+		noticed. That is a pointer comparison, a few microseconds for
+		thousands of traits. A list holding a trait that another list has
+		taken over is recounted on every call."""
+		if not self.__counts_current():
+			self.__recount()
+		return self.value_total
+
+	def totals_consistent(self):
+		"""Recounts the total from scratch and returns whether the running one
+		agrees, for tests."""
+		return self.value_total == sum([trait_value(t) for t in self.traits])
+	def get_children(self):
+		return self.traits
+
 	def get_num_entries(self):
 		return len(self.traits)
 
@@ -135,34 +423,129 @@ class TraitList(AttributedListModel):
 		else:
 			return self.get_total_value()
 
-	def get_xml(self, indent=''):
-		end_tag = ">\n" if len(self.traits) > 0 else "/>"
-		ret = '%s<traitlist %s%s' % (indent, self.get_attrs_xml(), end_tag)
+	def write_xml(self, out, indent=''):
+		if not self.traits:
+			out.write('%s<traitlist %s/>' % (indent, self.get_attrs_xml()))
+			return
+		out.write('%s<traitlist %s>\n' % (indent, self.get_attrs_xml()))
 		local_indent = '%s   ' % (indent)
-		ret += "\n".join([trait.get_xml(local_indent) for trait in self.traits])
-		if len(self.traits) > 0:
-			ret += '%s%s</traitlist>' % ("\n", indent)
-		return ret
+		separator = ''
+		for trait in self.traits:
+			out.write(separator)
+			trait.write_xml(out, local_indent)
+			separator = "\n"
+		out.write('%s%s</traitlist>' % ("\n", indent))
 	def __str__(self):
 		return self.get_xml()
 
-	def __added_trait(self, trait):
-		"""Should make copy""" 
-		pass
-	def __modified_trait(self, original, modified):
-		"""Given copies"""
-		pass
-	def __incremented_trait(self, trait):
-		"""Should make copy"""
-		pass
-	def __decremented_trait(self, trait):
-		"""Should make copy"""
-		pass
-	def __deleted_trait(self, trait):
-		"""Given copies"""
-		pass
+	def __journal(self, op, trait, name, old_val, new_val, old_note, new_note):
+		if self.trait_changes is None:
+			self.trait_changes = ChangeJournal()
+		self.trait_changes.record(op, name, old_val, new_val, old_note, new_note, trait)
+	def clear_dirty(self, deep=False):
+		"""Also empties the change journal, which like the dirty flags covers
+		the edits made since the list was loaded or saved."""
+		AttributedListModel.clear_dirty(self, deep)
+		self.trait_changes = None
 	def get_changes_strings(self, display = "1"):
-		pass
+		if self.trait_changes is None:
+			return ChangeStrings()
+		return self.trait_changes.strings(display)
+	def get_changes_summary(self):
+		if self.trait_changes is None:
+			return ''
+		return self.trait_changes.summary()
+
+def shown_val(trait):
+	"The value to print for a trait, or '' when it is empty or zero."
+	val = trait.val
+	if not val or (val[0] == '0' and val_number(trait) == 0):
+		return ''
+	return val
+
+def tally_count(trait):
+	"The number of dots a trait's value is drawn with."
+	number = val_number(trait)
+	if not number:
+		return 0
+	return int(round(number))
+
+def note_suffix(trait):
+	if trait.note:
+		return ' (%s)' % (trait.note)
+	return ''
+
+def display_name(trait, dot):
+	return trait.name
+
+def display_val_note(trait, dot):
+	val = shown_val(trait)
+	vstr = (' x%s' % (val)) if val else ''
+	return '%s%s%s' % (trait.name, vstr, note_suffix(trait))
+
+def display_val_tally_note(trait, dot):
+	val = shown_val(trait)
+	vstr = (' x%s' % (val)) if val else ''
+	count = tally_count(trait)
+	if count:
+		vstr += ' %s' % (dot * count)
+	return '%s%s%s' % (trait.name, vstr, note_suffix(trait))
+
+def display_tally_note(trait, dot):
+	count = tally_count(trait)
+	vstr = (' %s' % (dot * count)) if count else ''
+	return '%s%s%s' % (trait.name, vstr, note_suffix(trait))
+
+def display_paren_val_note(trait, dot):
+	val = shown_val(trait)
+	note = trait.note
+	if val and note:
+		return '%s (%s, %s)' % (trait.name, val, note)
+	if val or note:
+		return '%s (%s)' % (trait.name, val or note)
+	return trait.name
+
+def display_paren_note(trait, dot):
+	return '%s%s' % (trait.name, note_suffix(trait))
+
+def display_paren_val(trait, dot):
+	val = shown_val(trait)
+	if val:
+		return '%s (%s)' % (trait.name, val)
+	return trait.name
+
+def display_repeated(trait, dot):
+	text = '%s%s' % (trait.name, note_suffix(trait))
+	return dot.join([text] * max(1, tally_count(trait)))
+
+def display_tally(trait, dot):
+	return dot * tally_count(trait)
+
+def display_val(trait, dot):
+	return shown_val(trait)
+
+def display_note(trait, dot):
+	return trait.note
+
+def display_unknown(trait, dot):
+	return None
+
+# Grapevine's display codes for a trait, each mapped to the function that
+# formats a trait that way
+display_formatters = {
+	'0' : display_name,
+	'1' : display_val_note,
+	'2' : display_val_tally_note,
+	'3' : display_tally_note,
+	'4' : display_paren_val_note,
+	'5' : display_paren_note,
+	'6' : display_paren_val,
+	'7' : display_repeated,
+	'8' : display_tally,
+	'9' : display_val,
+	'10' : display_note,
+	'Default' : display_val_note
+}
 
 class Trait(Attributed):
 	required_attrs = ['name']
@@ -170,92 +553,17 @@ class Trait(Attributed):
 	number_as_text_attrs = ['val']
 	defaults = { 'val' : '1' }
 	
-	def get_xml(self, indent=''):
-		return '%s<trait %s/>' % (indent, self.get_attrs_xml())
+	def write_xml(self, out, indent=''):
+		out.write('%s<trait %s/>' % (indent, self.get_attrs_xml()))
 	def __str__(self):
 		return self.get_xml()
-	
-	def __val_as_float(self):
-		try:
-			return float(self.val)
-		except ValueError:
-			return 0
-	def __show_note(self):
-		return True if self.note else False
-	def __show_val(self):
-		return True if self.val else False
-	def __tally_val(self):
-		return True if self.__val_as_float else False
 
 	def tally_str(self, dot="O"):
-		if not self.__tally_val():
-			return ''
-		else:
-			num_dots = int(round(self.__val_as_float()))
-			ret = ""
-			for i in range(num_dots):
-				ret += "%s" % (dot)
-			return ret
+		return dot * tally_count(self)
 	def display_str(self, display="1", dot="O"):
-		show_note = self.__show_note()
-		show_val  = self.__show_val()
-		tally_val = self.__tally_val()
-		
-		if display == "0":
-			return "%s" % (self.name)
-		elif display == "1":
-			vstr = (" x%s" % (self.val)) if show_val else ''
-			nstr = (" (%s)" % (self.note)) if show_note else ''
-			return "%s%s%s" % (self.name, vstr, nstr)
-		elif display == "2":
-			if show_val:
-				vstr = (" x%s" % (self.val))
-			if tally_val:
-				vstr += " %s" % (self.tally_str(dot))
-			nstr = (" (%s)" % (self.note)) if show_note else ''
-			return "%s%s%s" % (self.name, vstr, nstr)
-		elif display == "3":
-			if tally_val:
-				vstr = " %s" % (self.tally_str(dot))
-			nstr = (" (%s)" % (self.note)) if show_note else ''
-			return "%s%s%s" % (self.name, vstr, nstr)
-		elif display == "4":
-			paren_str = ""
-			if show_note and show_val:
-				paren_str = " (%s, %s)" % (self.val, self.note)
-			elif show_note and not show_val:
-				paren_str = " (%s)" % (self.note)
-			elif show_val and not show_note:
-				paren_str = " (%s)" % (self.val)
-			return "%s%s" % (self.name, paren_str)
-		elif display == "5":
-			paren_str = ""
-			if show_note:
-				paren_str = " (%s)" % (self.note)
-			return "%s%s" % (self.name, paren_str)
-		elif display == "6":
-			paren_str = ""
-			if show_val:
-				paren_str = " (%s)" % (self.val)
-			return "%s%s" % (self.name, paren_str)
-		elif display == "7":
-			paren_str = (" (%s)" % (self.note)) if show_note else ''
-			dstr = "%s%s" % (self.name, paren_str)
-			its = []
-			for i in range(int(round(self.__val_as_float()))):
-				its.append(dstr)
-			return ("%s" % (dot)).join(its)
-		elif display == "8":
-			return self.tally_str(dot)
-		elif display == "9":
-			if show_val:
-				return "%s" % (self.val)
-			else:
-				return ''
-		elif display == "10":
-			if show_note:
-				return "%s" % (self.note)
-			else:
-				return ''
-		elif display == "Default":
-			return self.display_str()
+		"""Formats the trait for one of Grapevine's display codes, or returns
+		None for an unknown one."""
+		return display_formatters.get(display, display_unknown)(self, dot)
+
+# The parsed value of a trait, read without going through get_number()
+val_number = Trait.val.number
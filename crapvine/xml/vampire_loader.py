@@ -28,9 +28,60 @@ def normalize_whitespace(text):
 	"Remove redundant whitespace from a string"
 	return ' '.join(text.split())
 
+class LoadOptions(object):
+	"""Chooses what a chronicle load builds.
+
+	names limits the characters built to those names. predicate is called
+	with each Vampire once its own attributes are read, and the character is
+	dropped if it returns False. sections lists the parts of a character to
+	build, any of 'traitlists', 'experience', 'biography' and 'notes'.
+	compact_experience keeps each experience's entries in column storage,
+	see Experience.compact().
+
+	Events inside a dropped character or section are ignored without
+	creating any objects, so LoadOptions(sections=()) loads a roster in a
+	fraction of the time of a full load."""
+	all_sections = ('traitlists', 'experience', 'biography', 'notes')
+
+	def __init__(self, names=None, predicate=None, sections=all_sections,
+			compact_experience=False):
+		if names is not None:
+			names = frozenset(names)
+		self.names = names
+		self.predicate = predicate
+		self.sections = frozenset(sections)
+		self.compact_experience = compact_experience
+
+	def skips_section(self, element_name):
+		section = self.section_elements.get(element_name)
+		return section is not None and section not in self.sections
+
+	section_elements = {
+		'traitlist' : 'traitlists',
+		'experience' : 'experience',
+		'biography' : 'biography',
+		'notes' : 'notes'
+	}
+
 class VampireLoader(ContentHandler):
-	def __init__(self):
+	"""Builds Vampire objects from SAX events.
+
+	Finished vampires are kept in self.vampires by name, and their names in
+	added_names in the order they were added, unless an on_vampire callable
+	is given, in which case each one is handed to it instead and the loader
+	keeps nothing.
+
+	Element events are dispatched through the start_handlers and
+	end_handlers tables, which map an element name to the bound method
+	handling it, so other loaders can drive them directly."""
+	def __init__(self, on_vampire=None, options=None):
 		self.vampires = {}
+		self.added_names = []
+		self.on_vampire = on_vampire
+		self.options = options
+
+		self.skip_element = None
+		self.skip_depth = 0
 		self.current_vampire = None
 
 		self.in_cdata = False
@@ -45,87 +96,141 @@ class VampireLoader(ContentHandler):
 
 		self.current_experience = None
 
+		self.start_handlers = {
+			'vampire' : self.start_vampire,
+			'experience' : self.start_experience,
+			'entry' : self.start_entry,
+			'biography' : self.start_biography,
+			'notes' : self.start_notes,
+			'traitlist' : self.start_traitlist,
+			'trait' : self.start_trait
+		}
+		self.end_handlers = {
+			'vampire' : self.end_vampire,
+			'experience' : self.end_experience,
+			'traitlist' : self.end_traitlist,
+			'biography' : self.end_biography,
+			'notes' : self.end_notes
+		}
+
 	def add_vampire(self, vamp):
-		self.vampires[vamp.name] = vamp
+		if self.on_vampire:
+			self.on_vampire(vamp)
+		else:
+			self.vampires[vamp.name] = vamp
+			self.added_names.append(vamp.name)
+
+	def __skip(self, name):
+		self.skip_element = name
+		self.skip_depth = 1
 
 	def startElement(self, name, attrs):
-		if name == 'vampire':
-			if not attrs.has_key('name'):
-				return
-			v = Vampire()
-			v.read_attributes(attrs)
-			self.current_vampire = v
-
-		elif name == 'experience':
-			if self.current_experience:
-				raise IOError('Experience encountered while still reading traitlist')
-			exp = Experience()
-			exp.read_attributes(attrs)
-			self.current_experience = exp
-			if self.current_vampire:
-				self.current_vampire.add_experience(exp)
-
-		elif name == 'entry':
-			if not self.current_experience:
-				raise IOError('Entry without bounding Experience')
-			ent = ExperienceEntry()
-			ent.read_attributes(attrs)
-			self.current_experience.add_entry(ent, False)
-
-		elif name == 'entry':
-			pass
-
-		elif name == 'biography':
-			self.reading_biography = True
-
-		elif name == 'notes':
-			self.reading_notes = True
-
-		elif name == 'traitlist':
-			if self.current_traitlist:
-				raise IOError('TraitList encountered while still reading traitlist')
-			tl = TraitList()
-			tl.read_attributes(attrs)
-			self.current_traitlist = tl
-			if self.current_vampire:
-				self.current_vampire.add_traitlist(tl)
-
-		elif name == 'trait':
-			if not self.current_traitlist:
-				raise IOError('Trait without bounding traitlist')
-			t = Trait()
-			t.read_attributes(attrs)
-			self.current_traitlist.add_trait(t)
+		if self.skip_element:
+			if name == self.skip_element:
+				self.skip_depth += 1
+			return
+		if self.options and self.options.skips_section(name):
+			self.__skip(name)
+			return
+		handler = self.start_handlers.get(name)
+		if handler:
+			handler(attrs)
 
 	def endElement(self, name):
-		if name == 'vampire':
-			assert self.current_vampire
-			self.add_vampire(self.current_vampire)
-			self.current_vampire = None
-
-		elif name == 'experience':
-			assert self.current_experience
-			self.current_experience = None
-
-		elif name == 'traitlist':
-			assert self.current_traitlist
-			self.current_traitlist = None
-
-		elif name == 'biography':
-			assert self.reading_biography
-			self.reading_biography = False
-			if self.current_vampire:
-				self.current_vampire['biography'] = unescape(self.current_biography)
-				print self.current_biography
-			self.current_biography = ''
-
-		elif name == 'notes':
-			assert self.reading_notes
-			self.reading_notes = False
-			if self.current_vampire:
-				self.current_vampire['notes'] = unescape(self.current_notes)
-				print self.current_notes
-			self.current_notes = ''
+		if self.skip_element:
+			if name == self.skip_element:
+				self.skip_depth -= 1
+				if self.skip_depth == 0:
+					self.skip_element = None
+			return
+		handler = self.end_handlers.get(name)
+		if handler:
+			handler()
+
+	def start_vampire(self, attrs):
+		if not attrs.has_key('name'):
+			return
+		options = self.options
+		if options and options.names is not None and attrs.get('name') not in options.names:
+			self.__skip('vampire')
+			return
+		v = Vampire()
+		v.read_attributes(attrs)
+		if options and options.predicate and not options.predicate(v):
+			self.__skip('vampire')
+			return
+		self.current_vampire = v
+
+	def end_vampire(self):
+		assert self.current_vampire
+		self.current_vampire.clear_dirty(deep=True)
+		self.current_vampire.structural_hash()
+		self.add_vampire(self.current_vampire)
+		self.current_vampire = None
+
+	def start_experience(self, attrs):
+		if self.current_experience:
+			raise IOError('Experience encountered while still reading traitlist')
+		exp = Experience()
+		exp.read_attributes(attrs)
+		self.current_experience = exp
+		if self.current_vampire:
+			self.current_vampire.add_experience(exp)
+
+	def end_experience(self):
+		assert self.current_experience
+		if self.options and self.options.compact_experience:
+			self.current_experience.compact()
+		self.current_experience = None
+
+	def start_entry(self, attrs):
+		if not self.current_experience:
+			raise IOError('Entry without bounding Experience')
+		ent = ExperienceEntry()
+		ent.read_attributes(attrs)
+		self.current_experience.add_entry(ent, False)
+
+	def start_traitlist(self, attrs):
+		if self.current_traitlist:
+			raise IOError('TraitList encountered while still reading traitlist')
+		tl = TraitList()
+		tl.read_attributes(attrs)
+		self.current_traitlist = tl
+		if self.current_vampire:
+			self.current_vampire.add_traitlist(tl)
+
+	def end_traitlist(self):
+		assert self.current_traitlist
+		self.current_traitlist = None
+
+	def start_trait(self, attrs):
+		if not self.current_traitlist:
+			raise IOError('Trait without bounding traitlist')
+		t = Trait()
+		t.read_attributes(attrs)
+		self.current_traitlist.add_trait(t)
+
+	def start_biography(self, attrs):
+		self.reading_biography = True
+
+	def end_biography(self):
+		assert self.reading_biography
+		self.reading_biography = False
+		if self.current_vampire:
+			self.current_vampire['biography'] = unescape(self.current_biography)
+			print self.current_biography
+		self.current_biography = ''
+
+	def start_notes(self, attrs):
+		self.reading_notes = True
+
+	def end_notes(self):
+		assert self.reading_notes
+		self.reading_notes = False
+		if self.current_vampire:
+			self.current_vampire['notes'] = unescape(self.current_notes)
+			print self.current_notes
+		self.current_notes = ''
 
 	def characters(self, ch):
 		if self.reading_biography and self.in_cdata:
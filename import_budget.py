@@ -0,0 +1,91 @@
+"""Reports how long each module takes to import into a fresh interpreter and
+checks it against a cold-start budget.
+
+Every module is imported in its own child process so the numbers include
+everything that module pulls in. The heavy modules listed in WATCHED are
+reported when an import drags them in.
+
+Usage: python import_budget.py [module ...]
+Exits with status 1 if any module goes over its budget.
+"""
+import subprocess
+import sys
+
+# Milliseconds allowed for a cold import of each module
+BUDGET_MS = {
+    'crapvine.xml.attribute': 10,
+    'crapvine.xml.grapevine_xml': 15,
+    'crapvine.xml.trait': 20,
+    'crapvine.xml.experience': 20,
+    'crapvine.types.vampire': 20,
+    # The loaders need xml.sax.saxutils, which expat parsing imports anyway
+    'crapvine.xml.chronicle_loader': 50,
+    'crapvine.xml.menu': 10,
+    'crapvine.template.template': 10,
+    'xml_uploader': 250,
+    'vines': 100,
+}
+
+WATCHED = ('dateutil', 'pprint', 'inspect', 'xml.etree', 'models',
+           'xml_uploader', 'uploader', 'crapvine.xml.vampire_loader')
+
+PROBE = """
+import sys, time
+before = set(sys.modules)
+start = time.time()
+import %s
+elapsed = (time.time() - start) * 1000.0
+loaded = [m for m in set(sys.modules) - before if sys.modules[m] is not None]
+print '%%f' %% elapsed
+print ' '.join(sorted(loaded))
+"""
+
+def measure(module, runs=3):
+    """Returns the best import time in milliseconds and the modules loaded,
+    or None and the error output if the module cannot be imported here."""
+    best = None
+    loaded = []
+    for i in range(runs):
+        child = subprocess.Popen([sys.executable, '-c', PROBE % module],
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = child.communicate()
+        if child.returncode != 0:
+            return None, err.strip().splitlines()[-1:]
+        lines = out.splitlines()
+        elapsed = float(lines[-2])
+        if best is None or elapsed < best:
+            best = elapsed
+            loaded = lines[-1].split()
+    return best, loaded
+
+def watched_modules(loaded):
+    hits = set()
+    for name in loaded:
+        for watched in WATCHED:
+            if name == watched or name.startswith(watched + '.'):
+                hits.add(watched)
+    return sorted(hits)
+
+def main(argv):
+    modules = argv[1:] or sorted(BUDGET_MS)
+    over = []
+    print '%-32s %9s %9s  %s' % ('module', 'ms', 'budget', 'heavy imports')
+    for module in modules:
+        elapsed, loaded = measure(module)
+        budget = BUDGET_MS.get(module)
+        if elapsed is None:
+            print '%-32s %9s %9s  unavailable: %s' % (module, '-', budget, ' '.join(loaded))
+            continue
+        flag = ''
+        if budget is not None and elapsed > budget:
+            flag = ' OVER'
+            over.append(module)
+        print '%-32s %9.1f %9s  %s%s' % (module, elapsed, budget,
+                                         ' '.join(watched_modules(loaded)), flag)
+    if over:
+        print 'Over budget: %s' % (', '.join(over))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
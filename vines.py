@@ -1,4 +1,3 @@
-import os
 import urllib
 import webapp2
 
@@ -7,10 +6,6 @@ from google.appengine.ext.webapp import blobstore_handlers
 
 from google.appengine.api import users
 
-from xml_uploader import handle_sheet_upload
-
-from pprint import pformat
-
 class MainHandler(webapp2.RequestHandler):
   def get(self):
     upload_url = blobstore.create_upload_url('/upload')
@@ -27,6 +22,9 @@ class UploadHandler(blobstore_handlers.BlobstoreUploadHandler):
 
 class ServeHandler(blobstore_handlers.BlobstoreDownloadHandler):
   def get(self, resource):
+    # Deferred so instances serving only the upload form never load the
+    # parsers and models
+    from xml_uploader import handle_sheet_upload
     resource = str(urllib.unquote(resource))
     blob_reader = blobstore.BlobReader(resource)
     sheet = handle_sheet_upload(blob_reader, users.get_current_user())
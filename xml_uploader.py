@@ -1,19 +1,16 @@
 from xml.sax.saxutils import unescape
-import xml.etree.ElementTree as ET
 import codecs
 from datetime import datetime
-from pprint import pprint
 
 from uploader import create_base_vampire, read_experience_entry, read_traitlist_properties, read_trait
 
-from crapvine.types.vampire import Vampire as CrapvineVampire
-from crapvine.xml.trait import TraitList as CrapvineTraitList
-from crapvine.xml.trait import Trait as CrapvineTrait
-from crapvine.xml.experience import Experience as CrapvineExperience
-from crapvine.xml.experience import ExperienceEntry as CrapvineExperienceEntry
-
 class VampireExporter():
     def __init__(self, vampire_sheet):
+        from crapvine.types.vampire import Vampire as CrapvineVampire
+        from crapvine.xml.trait import TraitList as CrapvineTraitList
+        from crapvine.xml.trait import Trait as CrapvineTrait
+        from crapvine.xml.experience import Experience as CrapvineExperience
+        from crapvine.xml.experience import ExperienceEntry as CrapvineExperienceEntry
         from uploader import VAMPIRE_TAG_DATES, VAMPIRE_TAG_RENAMES
         from uploader import TRAIT_TAG_RENAMES
         from uploader import TRAITLIST_TAG_RENAMES
@@ -153,6 +150,7 @@ def read_vampire(v, user, date_hint):
     return current_vampire
 
 def base_read(f, user):
+    import xml.etree.ElementTree as ET
     uni_representation = codecs.EncodedFile(f, 'ascii', 'utf-8', errors='replace').read()
     tree = ET.fromstring(uni_representation)
     creatures = []